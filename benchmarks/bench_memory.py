@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+"""Measure the memory used by each Notification instance.
+
+For comparison, this includes a copy of the Notification class as it was
+before it used ``__slots__``, with a ``__dict__`` and three containers
+allocated up front. This doesn't need a bus or a notification server.
+"""
+from __future__ import print_function
+
+import tracemalloc
+
+import notify2
+
+class DictNotification(object):
+    id = 0
+    timeout = -1
+    
+    def __init__(self, summary, message='', icon=''):
+        self.summary = summary
+        self.message = message
+        self.icon = icon
+        self.hints = {}
+        self.actions = notify2.ActionsDictClass()
+        self.data = {}
+
+def no_op(n, action):
+    pass
+
+def make_plain(cls, summary):
+    return cls(summary, "Body")
+
+def make_full(cls, summary):
+    n = cls(summary, "Body")
+    n.hints['category'] = 'device'
+    n.actions['ack'] = ('Acknowledge', no_op, None)
+    n.data['alert'] = True
+    return n
+
+def per_instance(cls, make, count):
+    # Make the strings and the list to hold the instances first, so that
+    # only the instances themselves are measured.
+    summaries = ["Summary %d" % i for i in range(count)]
+    keep = [None] * count
+    
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for i in range(count):
+        keep[i] = make(cls, summaries[i])
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (after - before) / float(count)
+
+def main(count=50000):
+    for label, make in [("No hints, actions or data", make_plain),
+                        ("One hint, action and data item", make_full)]:
+        old = per_instance(DictNotification, make, count)
+        new = per_instance(notify2.Notification, make, count)
+        print(label)
+        print("  with __dict__:    %6.0f bytes per instance" % old)
+        print("  with __slots__:   %6.0f bytes per instance" % new)
+
+if __name__ == '__main__':
+    main()
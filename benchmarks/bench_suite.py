@@ -0,0 +1,220 @@
+#!/usr/bin/env python
+"""Measure the cost of the main notify2 operations.
+
+This runs against the in-process stub transport, or against the fake
+notification server on a private bus (see notify2.fake_server). It reports:
+
+- latency percentiles for show(), update() + show(), close(), and dispatching
+  an action signal to its callback;
+- throughput sending notifications with several requests in flight;
+- the size of the Notify message for a few kinds of notification;
+- memory used by each live notification, including its registry entry.
+
+For example::
+
+    python benchmarks/bench_suite.py --backend stub
+    python benchmarks/bench_suite.py --backend socket --latency 0.0005 \\
+        --json results.json
+
+The fake server runs in a thread of the same process, so absolute numbers for
+the bus backends include its work as well. Compare results from the same
+machine and settings.
+"""
+from __future__ import print_function
+
+import argparse
+import contextlib
+import json
+import time
+import tracemalloc
+
+import notify2
+from notify2 import _wire
+from notify2.fake_server import PrivateBus, FakeNotificationServer
+
+def no_op(*args):
+    pass
+
+def percentiles(samples):
+    samples = sorted(samples)
+    def pick(p):
+        return samples[min(len(samples) - 1, int(len(samples) * p))] * 1e6
+    return {'p50': pick(0.5), 'p90': pick(0.9), 'p99': pick(0.99),
+            'max': samples[-1] * 1e6}
+
+def time_each(op, number):
+    clock = time.perf_counter
+    samples = []
+    for i in range(number):
+        start = clock()
+        op(i)
+        samples.append(clock() - start)
+    return samples
+
+def make_notification(i=0):
+    n = notify2.Notification("Summary %d" % i, "Some body text",
+                             "dialog-information")
+    n.set_urgency(notify2.URGENCY_NORMAL)
+    n.set_category("im.received")
+    n.add_action("ack", "Acknowledge", no_op)
+    return n
+
+@contextlib.contextmanager
+def serving(backend, latency, mainloop=None, connections=1):
+    if backend == 'stub':
+        notify2.init("notify2 benchmark", backend='stub')
+        try:
+            yield notify2._client._transport
+        finally:
+            notify2.uninit()
+        return
+
+    with PrivateBus(), FakeNotificationServer(latency=latency) as server:
+        notify2.init("notify2 benchmark", backend=backend, mainloop=mainloop,
+                     connections=connections)
+        try:
+            yield server
+        finally:
+            notify2.uninit()
+
+def bench_latency(backend, mainloop, server, number):
+    res = {}
+    res['show'] = time_each(lambda i: make_notification(i).show(), number)
+
+    n = make_notification()
+    n.show()
+    def update(i):
+        n.update("Update %d" % i)
+        n.show()
+    res['update + show'] = time_each(update, number)
+
+    shown = [make_notification(i) for i in range(number)]
+    for s in shown:
+        s.show()
+    res['close'] = time_each(lambda i: shown[i].close(), number)
+
+    clicked = []
+    n = make_notification()
+    n.add_action("ack", "Acknowledge", lambda n, action: clicked.append(1))
+    n.show()
+    res['dispatch (in process)'] = time_each(
+        lambda i: notify2._action_callback(n.id, "ack"), number)
+
+    if notify2._client._have_mainloop:
+        def round_trip(i):
+            del clicked[:]
+            server.invoke_action(n.id, "ack")
+            while not clicked:
+                if (backend != 'stub') and (mainloop != 'thread'):
+                    notify2.process_events(1)
+        res['dispatch (from server)'] = time_each(round_trip, number)
+
+    return dict((k, percentiles(v)) for k, v in res.items())
+
+def bench_throughput(number, concurrency_levels):
+    res = {}
+    for concurrency in concurrency_levels:
+        batches = max(1, number // concurrency)
+        notifications = [make_notification(i)
+                         for i in range(batches * concurrency)]
+        start = time.perf_counter()
+        for b in range(batches):
+            notify2.show_many(
+                notifications[b * concurrency:(b + 1) * concurrency])
+        elapsed = time.perf_counter() - start
+        res[concurrency] = len(notifications) / elapsed
+    return res
+
+def notify_bytes(n):
+    args = n._make_notify_args(notify2.get_app_name())
+    body = args[:5] + (list(args[5]), notify2._hint_variants(args[6]), args[7])
+    msg = _wire.method_call(notify2._SERVICE, notify2._PATH,
+                            notify2._INTERFACE, 'Notify', 'susssasa{sv}i', body)
+    return len(msg.to_bytes())
+
+def bench_bytes():
+    plain = notify2.Notification("Summary", "Some body text")
+    typical = make_notification()
+    icon = make_notification()
+    icon.set_icon_from_buffer(b'\x80' * (64 * 64 * 4), 64, 64)
+    return {'plain': notify_bytes(plain),
+            'hints + action': notify_bytes(typical),
+            '64x64 icon': notify_bytes(icon)}
+
+def bench_memory(count):
+    # Register the notifications directly, so that only notify2's own memory
+    # is measured, not the transport's.
+    registry = notify2.notifications_registry
+    old_max, registry.max_size = registry.max_size, count
+    summaries = ["Summary %d" % i for i in range(count)]
+    keep = [None] * count
+    try:
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        for i in range(count):
+            keep[i] = n = make_notification()
+            n.summary = summaries[i]
+            registry[100000 + i] = n
+        after = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+    finally:
+        for i in range(count):
+            registry.pop(100000 + i, None)
+        registry.max_size = old_max
+    return (after - before) / float(count)
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Benchmark notify2 operations")
+    ap.add_argument('--backend', default='stub',
+                    choices=['stub', 'socket', 'dbus-python'])
+    ap.add_argument('--mainloop', choices=['thread'],
+                    help="Dispatch signals on a background thread (socket "
+                         "backend only)")
+    ap.add_argument('--connections', type=int, default=1,
+                    help="Spread notifications over this many bus "
+                         "connections")
+    ap.add_argument('--latency', type=float, default=0.0,
+                    help="Delay for each reply from the fake server (seconds)")
+    ap.add_argument('--number', type=int, default=2000,
+                    help="Operations to time for each measurement")
+    ap.add_argument('--concurrency', default='1,8,64',
+                    help="Comma separated numbers of requests in flight")
+    ap.add_argument('--json', metavar='FILE',
+                    help="Also write the results to a JSON file")
+    args = ap.parse_args(argv)
+    levels = [int(c) for c in args.concurrency.split(',')]
+
+    with serving(args.backend, args.latency, args.mainloop,
+                 args.connections) as server:
+        results = {
+            'backend': args.backend,
+            'mainloop': args.mainloop,
+            'connections': args.connections,
+            'latency': args.latency,
+            'latency_us': bench_latency(args.backend, args.mainloop, server,
+                                        args.number),
+            'throughput_per_s': bench_throughput(args.number, levels),
+            'notify_bytes': bench_bytes(),
+            'bytes_per_live_notification': bench_memory(args.number),
+        }
+
+    print("Backend: %s, server latency %g s" % (args.backend, args.latency))
+    print("\nLatency (us)            p50       p90       p99       max")
+    for op, p in sorted(results['latency_us'].items()):
+        print("  %-22s %8.1f  %8.1f  %8.1f  %8.1f"
+              % (op, p['p50'], p['p90'], p['p99'], p['max']))
+    print("\nThroughput (notifications/s)")
+    for c, rate in sorted(results['throughput_per_s'].items()):
+        print("  %3d in flight: %10.0f" % (c, rate))
+    print("\nNotify message size (bytes)")
+    for kind, size in sorted(results['notify_bytes'].items()):
+        print("  %-16s %7d" % (kind, size))
+    print("\nMemory per live notification: %.0f bytes"
+          % results['bytes_per_live_notification'])
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+"""Compare the cost of marshalling the Notify call for an ordinary
+notification and for one made from a NotificationTemplate, with dbus-python
+(if it's installed) and with the socket backend.
+
+The D-Bus messages are built but not sent, so this doesn't need a bus or a
+notification server.
+"""
+from __future__ import print_function
+
+import timeit
+
+import notify2
+from notify2 import _wire
+
+def no_op(n, action):
+    pass
+
+def make_prototype():
+    n = notify2.Notification("", icon="dialog-warning")
+    n.set_urgency(notify2.URGENCY_CRITICAL)
+    n.set_category("device")
+    n.set_hint("desktop-entry", "monitor")
+    n.set_location(1200, 40)
+    n.set_timeout(10000)
+    n.add_action("ack", "Acknowledge", no_op)
+    n.add_action("snooze", "Snooze", no_op)
+    n.add_action("details", "Details", no_op)
+    return n
+
+def marshal_dbus_python(n):
+    import dbus.lowlevel
+    msg = dbus.lowlevel.MethodCallMessage(notify2._SERVICE, notify2._PATH,
+                                          notify2._INTERFACE, 'Notify')
+    args = n._make_notify_args(notify2.get_app_name())
+    # As DBusPythonTransport does
+    args = args[:6] + (notify2._dbus_hints(args[6]),) + args[7:]
+    msg.append(signature='susssasa{sv}i', *args)
+
+def marshal_socket(n):
+    args = n._make_notify_args(notify2.get_app_name())
+    # As SocketTransport does
+    body = args[:5] + (list(args[5]), notify2._hint_variants(args[6]), args[7])
+    _wire.method_call(notify2._SERVICE, notify2._PATH, notify2._INTERFACE,
+                      'Notify', 'susssasa{sv}i', body).to_bytes()
+
+def compare(backend, marshal, proto, n, number):
+    plain = min(timeit.repeat(lambda: marshal(proto), number=number, repeat=3))
+    templated = min(timeit.repeat(lambda: marshal(n), number=number, repeat=3))
+    
+    print("%s:" % backend)
+    print("  Plain notification:    %.2f us per Notify call" % (plain / number * 1e6))
+    print("  NotificationTemplate:  %.2f us per Notify call" % (templated / number * 1e6))
+    print("  Speedup: %.2fx" % (plain / templated))
+
+def main(number=20000):
+    proto = make_prototype()
+    proto.summary, proto.message = "Disk full", "/var is 98% full"
+    template = notify2.NotificationTemplate(proto)
+    n = template.new("Disk full", "/var is 98% full")
+    
+    try:
+        import dbus
+    except ImportError:
+        print("dbus-python: not installed, skipped")
+    else:
+        compare("dbus-python", marshal_dbus_python, proto, n, number)
+    compare("socket", marshal_socket, proto, n, number)
+
+if __name__ == '__main__':
+    main()
@@ -32,7 +32,7 @@ if __name__ == '__main__':
     if not notify2.init("Multi Action Test", mainloop='glib'):
         sys.exit(1)
     
-    server_capabilities = notify2.get_server_caps()
+    server_capabilities = notify2.get_server_caps_set()
 
     n = notify2.Notification("Low disk space",
                               "You can free up some disk space by " +
@@ -1 +0,0 @@
-../notify2.py
\ No newline at end of file
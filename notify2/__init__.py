@@ -0,0 +1,2377 @@
+"""This is a pure-python replacement for notify-python, using python-dbus
+to communicate with the notifications server directly. It's compatible with
+Python 2 and 3, and its callbacks can work with Gtk 3 or Qt 4 applications.
+
+To use it, first call ``notify2.init('app name')``, then create and show notifications::
+
+    n = notify2.Notification("Summary",
+                             "Some body text",
+                             "notification-message-im"   # Icon name
+                            )
+    n.show()
+
+API docs are `available on ReadTheDocs <https://notify2.readthedocs.org/en/latest/>`_,
+or you can refer to docstrings.
+
+Based on the notifications spec at:
+http://developer.gnome.org/notification-spec/
+
+Porting applications from pynotify
+----------------------------------
+
+There are a few differences from pynotify you should be aware of:
+
+- If you need callbacks from notifications, notify2 must know about your event
+  loop. The simplest way is to pass 'glib' or 'qt' as the ``mainloop`` parameter
+  to ``init``.
+- The methods ``attach_to_widget`` and ``attach_to_status_icon`` are not
+  implemented. You can calculate the location you want the notification to
+  appear and call ``Notification``.
+- ``set_property`` and ``get_property`` are not implemented. The summary, body
+  and icon are accessible as attributes of a ``Notification`` instance.
+- Various methods that pynotify Notification instances got from gobject do not
+  exist, or only implement part of the functionality.
+
+Several pynotify functions, especially getters and setters, are only supported
+for compatibility. You are encouraged to use more direct, Pythonic alternatives.
+"""
+
+import os
+import struct
+import sys
+import time
+import zlib
+
+__version__ = '0.3.1'
+
+# dbus-python and some of the standard library modules we use are slow to
+# import, so we import them when they're first needed, to keep 'import notify2'
+# quick for programs which may not send any notifications.
+
+class _LazyModule(object):
+    """Stands in for a module, importing it when an attribute is first used.
+    """
+    def __init__(self, name):
+        self._name = name
+    
+    def __getattr__(self, attr):
+        module = __import__(self._name)
+        globals()[self._name] = module
+        return getattr(module, attr)
+
+dbus = _LazyModule('dbus')
+
+try:
+    _monotonic = time.monotonic
+except AttributeError:  # Python 2
+    _monotonic = time.time
+
+try:
+    _text_types = (str, unicode)   # Python 2: str is also bytes
+except NameError:
+    _text_types = (str,)
+
+# Constants
+EXPIRES_DEFAULT = -1
+EXPIRES_NEVER = 0
+
+URGENCY_LOW = 0
+URGENCY_NORMAL = 1
+URGENCY_CRITICAL = 2
+urgency_levels = [URGENCY_LOW, URGENCY_NORMAL, URGENCY_CRITICAL]
+
+# Initialise the module (following pynotify's API) -----------------------------
+
+# The module-level functions use a default NotificationClient (see below).
+# These are kept up to date from it for compatibility.
+initted = False
+appname = ""
+
+class UninittedError(RuntimeError):
+    """Error raised if you try to communicate with the server before calling
+    :func:`init`.
+    """
+    pass
+
+class UninittedDbusObj(object):
+    def __getattr__(self, name):
+        raise UninittedError("You must call notify2.init() before using the "
+                             "notification features.")
+
+dbus_iface = UninittedDbusObj()
+
+_SERVICE = 'org.freedesktop.Notifications'
+_PATH = '/org/freedesktop/Notifications'
+_INTERFACE = 'org.freedesktop.Notifications'
+
+def init(app_name, mainloop=None, lazy=False, backend='dbus-python',
+         threaded=False, connections=1, reconnect=False):
+    """Initialise the D-Bus connection. Must be called before you send any
+    notifications, or retrieve server info or capabilities.
+    
+    To get callbacks from notifications, DBus must be integrated with a mainloop.
+    There are three ways to achieve this:
+    
+    - Set a default mainloop (dbus.set_default_main_loop) before calling init()
+    - Pass the mainloop parameter as a string 'glib' or 'qt' to integrate with
+      those mainloops. (N.B. passing 'qt' currently makes that the default dbus
+      mainloop, because that's the only way it seems to work.)
+    - Pass the mainloop parameter a DBus compatible mainloop instance, such as
+      dbus.mainloop.glib.DBusGMainLoop().
+    
+    If you only want to display notifications, without receiving information
+    back from them, you can safely omit mainloop.
+    
+    If *lazy* is True, this only records the settings, and the connection is
+    made the first time it's needed, e.g. to show a notification. This makes
+    startup quicker for programs which may not send any notifications.
+    
+    *backend* selects how to talk to the notification server. It can be the
+    name of a transport, or a :class:`~notify2.transports.Transport` instance:
+    
+    - ``'dbus-python'`` (the default) uses the dbus-python bindings.
+    - ``'socket'`` speaks the D-Bus protocol directly over the session bus
+      socket, so dbus-python isn't needed. Signals for callbacks are queued
+      as they arrive, and dispatched when you call :func:`process_events`.
+      Or pass ``mainloop='thread'`` to receive and dispatch them on a
+      background thread, without GLib or Qt.
+    - ``'stub'`` doesn't talk to a server at all, for tests and benchmarks.
+    
+    See :mod:`notify2.transports` for more details.
+    
+    If *threaded* is True, notify2 can be used from several threads at once.
+    All calls to the server are made by a dedicated sender thread, and
+    :meth:`Notification.show` and :meth:`Notification.close` return a
+    :class:`concurrent.futures.Future` rather than waiting for the server.
+    Call :func:`init` and :func:`uninit` from one thread only. On Python 2,
+    this and :meth:`Notification.show_async` need the ``futures`` backport.
+    
+    If *connections* is more than 1, that many connections to the bus are
+    made with the named *backend*, and notifications are spread over them
+    (see :class:`~notify2.transports.PooledTransport`). In threaded mode,
+    each connection has its own sender thread, so several notifications can
+    be sent at once; the calls for any one notification are still made in
+    order.
+    
+    If *reconnect* is True, notifications which can't be sent because the
+    notification server or the session bus has gone away are held in an
+    outbox, instead of raising an error, and notify2 connects again to send
+    them. :meth:`Notification.show` returns False for a notification it
+    holds; in threaded mode, its future is done once it's sent. Reconnecting
+    is first tried after ``NotificationClient.reconnect_delay`` seconds, and
+    the delay doubles after each failure, up to
+    ``NotificationClient.max_reconnect_delay``. Held notifications are sent as
+    soon as the server is seen to start again, if there is a mainloop, or
+    otherwise by the next call after the delay. Waiting for the result of
+    :meth:`Notification.show_async` keeps trying, and in threaded mode, the
+    sender thread tries by itself. The outbox holds at most
+    ``NotificationClient.outbox_size`` notifications, discarding the oldest.
+    """
+    global appname, initted, dbus_iface
+    _client.init(app_name, mainloop, lazy, backend, threaded, connections,
+                 reconnect)
+    appname = app_name
+    initted = True
+    dbus_iface = _client.dbus_iface
+    return True
+
+class _LazyConnection(object):
+    """Stands in for the dbus_iface or _transport attribute of a
+    :class:`NotificationClient` set up with lazy=True, and connects when it's
+    first used.
+    """
+    def __init__(self, client, name):
+        self._client = client
+        self._name = name
+    
+    def __getattr__(self, attr):
+        self._client._connect_lazily()
+        return getattr(getattr(self._client, self._name), attr)
+
+def is_initted():
+    """Has init() been called? Only exists for compatibility with pynotify.
+    """
+    return initted
+
+def get_app_name():
+    """Return appname. Only exists for compatibility with pynotify.
+    """
+    return appname
+
+def uninit():
+    """Undo what init() does."""
+    global initted, dbus_iface
+    _client.uninit()
+    initted = False
+    dbus_iface = UninittedDbusObj()
+
+def process_events(timeout=0):
+    """Dispatch signals received by the ``'socket'`` backend (see
+    :func:`init`), waiting up to *timeout* seconds for them to arrive.
+    
+    With dbus-python, the mainloop does this instead.
+    
+    In threaded mode, the sender thread reads the signals and runs the
+    callbacks, so nothing else uses the connection at the same time; sending
+    notifications waits meanwhile.
+    """
+    _client.process_events(timeout)
+
+class _SenderThread(object):
+    """Makes all the calls to the transport from one thread, in threaded mode
+    (see :func:`init`).
+    
+    Other threads hand over work by appending to a deque, which is safe
+    without a lock, and setting an event to wake the sender thread.
+    """
+    _STOP = None   # Queued to stop the thread
+    
+    def __init__(self):
+        import collections, threading
+        self._queue = collections.deque()
+        self._wakeup = threading.Event()
+        self._thread = threading.Thread(target=self._run,
+                                        name='notify2 sender')
+        self._thread.daemon = True
+        self._thread.start()
+    
+    def submit(self, func, *args):
+        """Call func(*args) on the sender thread, and return a future for the
+        result.
+        """
+        future = _make_future()
+        self._queue.append((future, func, args))
+        self._wakeup.set()
+        return future
+    
+    def call(self, func, *args):
+        """Call func(*args) on the sender thread, and wait for the result.
+        """
+        import threading
+        if threading.current_thread() is self._thread:
+            # E.g. from a callback run by process_events()
+            return func(*args)
+        return self.submit(func, *args).result()
+    
+    def stop(self, func):
+        """Finish the calls already submitted, then call func() and stop.
+        """
+        self.submit(func)
+        self._queue.append(self._STOP)
+        self._wakeup.set()
+        self._thread.join()
+    
+    def _run(self):
+        queue = self._queue
+        while True:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            while queue:
+                item = queue.popleft()
+                if item is self._STOP:
+                    # Anything submitted after stop() won't be done.
+                    for future, func, args in queue:
+                        future.cancel()
+                    return
+                future, func, args = item
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    result = func(*args)
+                except BaseException as e:
+                    future.set_exception(e)
+                else:
+                    future.set_result(result)
+
+# Retrieve basic server information --------------------------------------------
+
+def invalidate_server_cache():
+    """Forget the cached server capabilities and information, so they are
+    requested again the next time they're needed.
+    
+    If there is a mainloop, this happens automatically when a different
+    notification server takes over the bus name.
+    """
+    _client.invalidate_server_cache()
+
+def get_server_caps():
+    """Get a list of server capabilities.
+    
+    These are short strings, listed `in the spec <http://people.gnome.org/~mccann/docs/notification-spec/notification-spec-latest.html#commands>`_.
+    Vendors may also list extra capabilities with an 'x-' prefix, e.g. 'x-canonical-append'.
+    
+    The server is only asked the first time; after that, this returns the
+    cached list (see :func:`invalidate_server_cache`).
+    """
+    return _client.get_server_caps()
+
+def get_server_caps_set():
+    """Get server capabilities as a frozenset, for quick checks like
+    ``'actions' in notify2.get_server_caps_set()``.
+    
+    This uses the same cache as :func:`get_server_caps`.
+    """
+    return _client.get_server_caps_set()
+
+def get_server_info():
+    """Get basic information about the server.
+    
+    Like :func:`get_server_caps`, this is cached after the first call.
+    """
+    return _client.get_server_info()
+
+# Action callbacks -------------------------------------------------------------
+
+if sys.version_info >= (3, 7):
+    ActionsDictClass = dict   # dicts preserve insertion order
+else:
+    try:
+        from collections import OrderedDict as ActionsDictClass
+    except ImportError:  # fallback for old version of Python
+        ActionsDictClass = dict
+
+class _NoLock(object):
+    def __enter__(self):
+        pass
+    
+    def __exit__(self, *exc_info):
+        pass
+
+_no_lock = _NoLock()
+
+class NotificationRegistry(object):
+    """Maps notification IDs to the notifications shown, so that signals from
+    the server can be passed to them.
+    
+    Some servers don't tell us when notifications are closed, so this is
+    bounded to stop it growing forever in long running programs:
+    
+    max_size : int
+      How many notifications to track. When there are more, the least
+      recently used are forgotten.
+    weak : bool
+      If True, only hold weak references to notifications, so they can be
+      garbage collected once your code no longer refers to them. You then need
+      to keep a reference to any notification you want callbacks from.
+    grace : float
+      Notifications with a timeout are forgotten this many seconds after they
+      should have expired.
+    default_ttl : float
+      How many seconds to track notifications which use the server's default
+      timeout; None means they aren't expired, except by *max_size*.
+      Notifications which never expire are not expired by time.
+    
+    You can change these attributes on ``notify2.notifications_registry``.
+    It supports the basic operations of a dict, including ``keys()``,
+    ``values()`` and ``items()``, which return lists.
+    """
+    _clock = staticmethod(_monotonic)
+    
+    def __init__(self, max_size=1000, weak=False, grace=60.0, default_ttl=None):
+        self.max_size = max_size
+        self.weak = weak
+        self.grace = grace
+        self.default_ttl = default_ttl
+        self._entries = ActionsDictClass()   # id -> (ref, expiry time)
+        self._next_expiry = None
+        self._collected = False   # Weakly referenced notifications have gone
+        # Replaced by a real lock in threaded mode (see init())
+        self.lock = _no_lock
+        # Called when the last notification is removed
+        self.on_empty = None
+    
+    def _ttl(self, n):
+        if n.timeout > 0:
+            return n.timeout / 1000. + self.grace
+        elif n.timeout == EXPIRES_DEFAULT:
+            return self.default_ttl
+        return None
+    
+    def __setitem__(self, nid, n):
+        ttl = self._ttl(n)
+        expires = None if ttl is None else self._clock() + ttl
+        if self.weak:
+            import weakref
+            ref = weakref.ref(n, self._discard)
+        else:
+            ref = lambda: n
+        with self.lock:
+            self._purge()
+            self._entries.pop(nid, None)
+            self._entries[nid] = (ref, expires)
+            if (expires is not None) and ((self._next_expiry is None) or
+                                          (expires < self._next_expiry)):
+                self._next_expiry = expires
+            
+            self.expire()
+            while len(self._entries) > self.max_size:
+                del self._entries[next(iter(self._entries))]
+    
+    def __getitem__(self, nid):
+        if self._purge():
+            self._removed()
+        with self.lock:
+            ref, expires = self._entries.pop(nid)
+            n = ref()
+            if n is None:
+                raise KeyError(nid)
+            self._entries[nid] = (ref, expires)   # Now most recently used
+            return n
+    
+    def __delitem__(self, nid):
+        with self.lock:
+            del self._entries[nid]
+        self._removed()
+    
+    def _discard(self, ref):
+        """Called when a weakly referenced notification is garbage collected.
+        
+        That can happen at any point, even while this or the connection is
+        in use, so it's only noted here, and the notification is forgotten
+        by the next operation on the registry.
+        """
+        self._collected = True
+    
+    def _purge(self):
+        """Forget garbage collected notifications. Returns True if there may
+        have been some.
+        """
+        if not self._collected:
+            return False
+        with self.lock:
+            self._collected = False
+            for nid, (ref, expires) in list(self._entries.items()):
+                if ref() is None:
+                    del self._entries[nid]
+        return True
+    
+    def _removed(self):
+        if (not self._entries) and (self.on_empty is not None):
+            self.on_empty()
+    
+    def __iter__(self):
+        return iter(self.keys())
+    
+    def __len__(self):
+        self._purge()
+        return len(self._entries)
+    
+    def keys(self):
+        with self.lock:
+            self._purge()
+            return list(self._entries)
+    
+    def values(self):
+        return [n for nid, n in self.items()]
+    
+    def items(self):
+        with self.lock:
+            self._purge()
+            items = [(nid, ref()) for nid, (ref, expires)
+                     in self._entries.items()]
+        return [(nid, n) for nid, n in items if n is not None]
+    
+    def __contains__(self, nid):
+        try:
+            self[nid]
+        except KeyError:
+            return False
+        return True
+    
+    def get(self, nid, default=None):
+        try:
+            return self[nid]
+        except KeyError:
+            return default
+    
+    def pop(self, nid, *default):
+        with self.lock:
+            try:
+                n = self[nid]
+            except KeyError:
+                if default:
+                    return default[0]
+                raise
+            del self._entries[nid]
+        self._removed()
+        return n
+    
+    def clear(self):
+        with self.lock:
+            self._entries.clear()
+            self._next_expiry = None
+        self._removed()
+    
+    def expire(self):
+        """Forget notifications which have expired or been garbage collected.
+        
+        This is called automatically as notifications are added.
+        """
+        if self._purge():
+            self._removed()
+        now = self._clock()
+        if (self._next_expiry is None) or (now < self._next_expiry):
+            return
+        
+        with self.lock:
+            self._next_expiry = None
+            for nid, (ref, expires) in list(self._entries.items()):
+                if expires is None:
+                    pass
+                elif expires <= now:
+                    del self._entries[nid]
+                    continue
+                elif (self._next_expiry is None) or \
+                        (expires < self._next_expiry):
+                    self._next_expiry = expires
+                if ref() is None:
+                    del self._entries[nid]
+        self._removed()
+
+notifications_registry = NotificationRegistry()
+
+def _action_callback(nid, action):
+    _client._action_callback(nid, action)
+
+def _closed_callback(nid, reason):
+    _client._closed_callback(nid, reason)
+
+def set_callback_executor(executor):
+    """Run callbacks from notifications (see :meth:`Notification.add_action`
+    and :meth:`Notification.connect`) with *executor*, rather than in the
+    thread which receives the signals, so slow callbacks don't hold up
+    others.
+    
+    *executor* can be a :class:`concurrent.futures.Executor`, such as a
+    :class:`~concurrent.futures.ThreadPoolExecutor`, or an asyncio event loop.
+    With an event loop, callbacks run in the loop's thread, and if a callback
+    returns a coroutine, it is awaited. Pass None (the default) to call
+    callbacks directly again.
+    
+    Callbacks for the same notification run one at a time, in the order the
+    signals arrived. Callbacks for different notifications may run
+    concurrently.
+    """
+    _client.set_callback_executor(executor)
+
+class _CallbackQueue(object):
+    """Passes callbacks to an executor or event loop, keeping those for each
+    notification in order.
+    """
+    def __init__(self, executor):
+        import collections, threading
+        self._deque = collections.deque
+        self.executor = executor
+        self._is_loop = hasattr(executor, 'call_soon_threadsafe')
+        self._lock = threading.Lock()
+        # nid -> callbacks waiting; there's an entry while one is running
+        self._waiting = {}
+    
+    def put(self, nid, func, *args):
+        with self._lock:
+            waiting = self._waiting.get(nid)
+            if waiting is not None:
+                waiting.append((func, args))
+                return
+            self._waiting[nid] = self._deque([(func, args)])
+        if self._is_loop:
+            self.executor.call_soon_threadsafe(self._run, nid)
+        else:
+            self.executor.submit(self._run, nid)
+    
+    def _next(self, nid):
+        with self._lock:
+            waiting = self._waiting[nid]
+            if not waiting:
+                del self._waiting[nid]
+                return None
+            return waiting.popleft()
+    
+    def _run(self, nid):
+        while True:
+            item = self._next(nid)
+            if item is None:
+                return
+            func, args = item
+            try:
+                res = func(*args)
+            except Exception:
+                import traceback
+                traceback.print_exc()
+                continue
+            if self._is_loop and hasattr(res, '__await__'):
+                import asyncio
+                task = asyncio.ensure_future(res, loop=self.executor)
+                task.add_done_callback(lambda t: self._resume(t, nid))
+                return
+    
+    def _resume(self, task, nid):
+        if (not task.cancelled()) and (task.exception() is not None):
+            import traceback
+            exc = task.exception()
+            traceback.print_exception(type(exc), exc, exc.__traceback__)
+        self._run(nid)
+
+def no_op(*args):
+    """No-op function for callbacks.
+    """
+    pass
+
+_NotifyFuture = None
+
+def _make_future():
+    """Make a future for the ID of a notification sent by
+    :meth:`Notification.show_async`.
+    
+    concurrent.futures is slow to import, so the class is defined the first
+    time this is called.
+    """
+    global _NotifyFuture
+    if _NotifyFuture is None:
+        from concurrent.futures import Future
+        
+        class _NotifyFuture(Future):
+            # Without a mainloop, nothing else will dispatch the reply, so
+            # asking for the result blocks on the pending D-Bus call.
+            _pending = None
+            
+            def _wait_for_reply(self, timeout):
+                """Wait up to *timeout* seconds for the reply, and return the
+                time left.
+                """
+                deadline = None if timeout is None else _monotonic() + timeout
+                # The notification may be held for reconnecting (see init())
+                # while waiting, replacing the pending call.
+                pending = None
+                while (not self.done()) and (self._pending is not None) \
+                        and (self._pending is not pending):
+                    pending = self._pending
+                    if deadline is None:
+                        pending.block()
+                    elif hasattr(pending, 'wait'):
+                        # The socket backend, or a held call
+                        pending.wait(max(0, deadline - _monotonic()))
+                    else:
+                        # dbus-python can only wait for its own timeout
+                        pending.block()
+                if deadline is not None:
+                    return max(0, deadline - _monotonic())
+            
+            def result(self, timeout=None):
+                return Future.result(self, self._wait_for_reply(timeout))
+            
+            def exception(self, timeout=None):
+                return Future.exception(self, self._wait_for_reply(timeout))
+    
+    return _NotifyFuture()
+
+class _HeldCall(object):
+    """Stands in for the pending call of a notification which
+    :meth:`Notification.show_async` is holding until it can reconnect (see
+    *reconnect* in :func:`init`). Without a sender thread, nothing else would
+    try again, so waiting for the result does.
+    """
+    def __init__(self, client, future):
+        self._client = client
+        self._future = future
+    
+    def block(self):
+        self.wait(None)
+    
+    def wait(self, timeout):
+        client = self._client
+        deadline = None if timeout is None else _monotonic() + timeout
+        while client._down and not self._future.done():
+            wait = client._retry_at - _monotonic()
+            if deadline is not None:
+                if deadline <= _monotonic():
+                    return
+                wait = min(wait, deadline - _monotonic())
+            if wait > 0:
+                time.sleep(wait)
+            client._check_connection()
+
+# Clients ----------------------------------------------------------------------
+
+class NotificationClient(object):
+    """A connection to the notification server, with its own app name,
+    callbacks and cached server information.
+    
+    The module-level functions, such as :func:`init` and
+    :func:`get_server_caps`, use a default client. Make more clients to send
+    notifications with several app names, or over separate connections, from
+    one process::
+    
+        client = notify2.NotificationClient("Tenant A", backend='socket')
+        n = notify2.Notification("Summary", client=client)
+        n.show()
+    
+    If *app_name* is given, the other parameters are passed to :meth:`init`;
+    otherwise, call that before using the client.
+    
+    registry : NotificationRegistry
+      Where to track this client's notifications for callbacks. By default,
+      each client has a new one.
+    """
+    #: With reconnect=True, seconds to wait before trying to reconnect. This
+    #: doubles after each failed attempt, up to max_reconnect_delay.
+    reconnect_delay = 0.5
+    max_reconnect_delay = 60.0
+    #: With reconnect=True, how many notifications to hold while the server
+    #: can't be reached.
+    outbox_size = 100
+    
+    def __init__(self, app_name=None, mainloop=None, lazy=False,
+                 backend='dbus-python', threaded=False, connections=1,
+                 reconnect=False, registry=None):
+        self.initted = False
+        self.app_name = ""
+        #: The dbus-python proxy for the server, when that backend is used.
+        self.dbus_iface = UninittedDbusObj()
+        if registry is None:
+            registry = NotificationRegistry()
+        registry.on_empty = self._registry_emptied
+        self.registry = registry
+        self._transport = UninittedDbusObj()
+        self._lazy_settings = None
+        self._connections = 1
+        self._sender = None
+        self._senders = []
+        # Guards the subscription state when there are several sender threads
+        self._lock = _no_lock
+        self._have_mainloop = False
+        # Signals about notifications are only subscribed to while there are
+        # notifications with callbacks - those being shown, and those in the
+        # registry - so idle programs aren't woken up for every notification
+        # on the desktop.
+        self._subscribed = False
+        self._showing = 0   # Notifications with callbacks waiting for their ID
+        # Signals which may be about those, arriving before the reply with
+        # their ID is handled: nid -> [(callback, arg)]
+        self._early_signals = {}
+        self._early_lock = None
+        self._callback_queue = None
+        # Reconnecting: the settings to connect with, whether the connection
+        # has been lost, and notifications waiting to be sent.
+        self._reconnect = False
+        self._settings = None
+        self._down = False
+        self._last_error = None
+        self._retry_delay = self.reconnect_delay
+        self._retry_at = 0
+        self._retry_timer = None
+        import collections
+        self._outbox = collections.deque()   # (notification, [futures])
+        self.invalidate_server_cache()
+        if app_name is not None:
+            self.init(app_name, mainloop, lazy, backend, threaded,
+                      connections, reconnect)
+    
+    def init(self, app_name, mainloop=None, lazy=False, backend='dbus-python',
+             threaded=False, connections=1, reconnect=False):
+        """Set up the connection. The parameters are the same as for
+        :func:`notify2.init`.
+        """
+        if isinstance(backend, str):
+            from notify2.transports import backends
+            if backend not in backends:
+                raise ValueError("Unknown backend %r; use one of %s"
+                                 % (backend, ', '.join(sorted(backends))))
+            backends[backend].check_mainloop(mainloop)
+        elif mainloop is not None:
+            raise ValueError("Pass a mainloop to the transport, not to init()")
+        elif connections != 1:
+            raise ValueError("Pass a backend name to use several connections")
+        
+        if self.initted:
+            # Close the old connection and stop its threads
+            self.uninit()
+        
+        self.app_name = app_name
+        self.initted = True
+        self._connections = connections
+        self._reconnect = reconnect
+        self._settings = (mainloop, backend)
+        self._retry_delay = self.reconnect_delay
+        self.invalidate_server_cache()
+        
+        if threaded:
+            import threading
+            self.registry.lock = threading.RLock()
+            self._senders = [_SenderThread() for i in range(connections)]
+            self._sender = self._senders[0]
+            if connections > 1:
+                self._lock = threading.RLock()
+            # The sender thread connects when it first needs to, so that only
+            # it uses the transport.
+            lazy = True
+        
+        if lazy:
+            self._lazy_settings = (mainloop, backend)
+            self.dbus_iface = _LazyConnection(self, 'dbus_iface')
+            self._transport = _LazyConnection(self, '_transport')
+        else:
+            try:
+                self._connect(mainloop, backend)
+            except BaseException:
+                self.initted = False
+                raise
+        return True
+    
+    def _connect(self, mainloop, backend='dbus-python'):
+        """Connect to the bus and the notification server.
+        """
+        global dbus_iface
+        
+        if isinstance(backend, str):
+            from notify2.transports import backends, PooledTransport
+            if self._connections > 1:
+                transport = PooledTransport.connect(backend, self._connections,
+                                                    mainloop)
+            elif mainloop is not None:
+                transport = backends[backend](mainloop)
+            else:
+                transport = backends[backend]()
+        else:
+            transport = backend
+        
+        self._lazy_settings = None
+        self._subscribed = False
+        self._transport = transport
+        # For compatibility, dbus_iface is still the dbus-python proxy object
+        # when that's in use.
+        self.dbus_iface = getattr(transport, 'interface', UninittedDbusObj())
+        if self is _client:
+            dbus_iface = self.dbus_iface
+        self._have_mainloop = transport.receives_signals
+        if self._have_mainloop:
+            transport.watch_server(self._server_owner_changed)
+    
+    def uninit(self):
+        """Undo what :meth:`init` does, closing the connection."""
+        if self._retry_timer is not None:
+            self._retry_timer.cancel()
+            self._retry_timer = None
+        if self._sender is not None:
+            senders, self._senders, self._sender = self._senders, [], None
+            for sender in senders[1:]:
+                sender.stop(no_op)
+            senders[0].stop(self._disconnect)
+        else:
+            self._disconnect()
+        self.initted = False
+        self._have_mainloop = False
+        self._subscribed = False
+        self._showing = 0
+        self._early_signals.clear()
+        self.dbus_iface = UninittedDbusObj()
+        self._transport = UninittedDbusObj()
+        self._lazy_settings = None
+        self._connections = 1
+        self._lock = _no_lock
+        self._reconnect = False
+        self._settings = None
+        self._down = False
+        self._last_error = None
+        self._retry_delay = self.reconnect_delay
+        while self._outbox:
+            for future in self._outbox.popleft()[1]:
+                future.cancel()
+        self.invalidate_server_cache()
+        # Callbacks can't arrive without a connection, and IDs from a new one
+        # would be mixed up with these.
+        self.registry.clear()
+    
+    def _connect_lazily(self):
+        with self._lock:
+            # Another sender thread may have connected while this waited.
+            if self._lazy_settings is not None:
+                self._connect(*self._lazy_settings)
+    
+    def _disconnect(self):
+        if self._lazy_settings is None and self.initted:   # If it connected
+            try:
+                self._transport.close()
+            except Exception:
+                if not self._down:
+                    raise
+    
+    def process_events(self, timeout=0):
+        """Dispatch signals received by the ``'socket'`` backend. See
+        :func:`notify2.process_events`.
+        """
+        if self._sender is not None:
+            return self._sender.call(self._process_events_now, timeout)
+        self._process_events_now(timeout)
+    
+    def _process_events_now(self, timeout):
+        if self._reconnect and not self._check_connection():
+            time.sleep(timeout)   # As if waiting for signals
+            return
+        try:
+            self._transport.process_events(timeout)
+        except Exception as e:
+            if not self._lost(e):
+                raise
+    
+    def _call_transport(self, method, *args):
+        """Call a method of the transport, on the sender thread if there is
+        one.
+        """
+        if self._sender is not None:
+            return self._sender.call(self._call_transport_now, method, args)
+        return self._call_transport_now(method, args)
+    
+    def _call_transport_now(self, method, args):
+        if self._reconnect:
+            if not self._check_connection():
+                raise self._last_error
+            try:
+                result = getattr(self._transport, method)(*args)
+            except Exception as e:
+                self._lost(e)
+                raise
+            self._retry_delay = self.reconnect_delay
+            return result
+        return getattr(self._transport, method)(*args)
+    
+    # Reconnecting, with reconnect=True (see init())
+    
+    def _lost(self, exc):
+        """Check an error from the transport. If it means the connection
+        has been lost, schedule reconnecting, and return True.
+        """
+        from notify2.transports import connection_lost
+        if not (self._reconnect and connection_lost(exc)):
+            return False
+        with self._lock:
+            self._last_error = exc
+            if not self._down:
+                # Failed attempts to reconnect schedule the next one, so the
+                # delay grows per attempt, not per call.
+                self._down = True
+                self._schedule_retry()
+        return True
+    
+    def _schedule_retry(self):
+        self._retry_at = _monotonic() + self._retry_delay
+        self._start_timer(self._retry_delay)
+        self._retry_delay = min(self._retry_delay * 2,
+                                self.max_reconnect_delay)
+    
+    def _start_timer(self, delay):
+        # Without a sender thread, there's nothing to retry in the
+        # background, so the next call does it.
+        if (self._sender is not None) and (self._retry_timer is None):
+            import threading
+            self._retry_timer = threading.Timer(delay, self._sender.submit,
+                                                (self._retry,))
+            self._retry_timer.daemon = True
+            self._retry_timer.start()
+    
+    def _retry(self):
+        with self._lock:
+            self._retry_timer = None
+            if self._down and not self._check_connection():
+                self._start_timer(max(0, self._retry_at - _monotonic()))
+    
+    def _check_connection(self):
+        """If the connection has been lost, reconnect once it's time to try
+        again, and send the notifications held meanwhile.
+        
+        Returns True if the connection is (now) working.
+        """
+        if not self._down:
+            return True
+        with self._lock:
+            if not self._down:
+                return True
+            if _monotonic() < self._retry_at:
+                return False
+            try:
+                self._connect_again()
+            except Exception as e:
+                # Whatever went wrong, try again later.
+                self._last_error = e
+                self._schedule_retry()
+                return False
+            # The delay is only reset once the server answers, as the bus may
+            # be reachable without it.
+            self._down = False
+            self._send_held()
+            return not self._down
+    
+    def _connect_again(self):
+        mainloop, backend = self._settings
+        # A transport passed to init() is reused; otherwise, make a new one
+        if isinstance(backend, str) and (self._lazy_settings is None):
+            try:
+                self._transport.close()
+            except Exception:
+                pass   # It's already broken
+        self._connect(mainloop, backend)
+        # Listen for signals again, if notifications need them.
+        if self._showing or len(self.registry):
+            self._subscribe()
+    
+    def _hold(self, n, futures, first=False):
+        """Keep notification *n* in the outbox, to be sent once the server
+        can be reached again.
+        """
+        with self._lock:
+            outbox = self._outbox
+            for i, (held, held_futures) in enumerate(outbox):
+                if held is n:
+                    del outbox[i]
+                    futures = held_futures + futures
+                    break
+            if first:
+                outbox.appendleft((n, futures))
+            else:
+                outbox.append((n, futures))
+            if self._sender is None:
+                # Nothing retries in the background, so waiting for the
+                # result does.
+                for future in futures:
+                    future._pending = _HeldCall(self, future)
+            while len(outbox) > self.outbox_size:
+                for future in outbox.popleft()[1]:
+                    if not future.done():
+                        future.set_exception(self._last_error)
+    
+    def _unhold(self, n):
+        """Remove notification *n* from the outbox, if it's there.
+        """
+        with self._lock:
+            outbox = self._outbox
+            for i, (held, held_futures) in enumerate(outbox):
+                if held is n:
+                    del outbox[i]
+                    for future in held_futures:
+                        future.cancel()
+                    return
+    
+    def _send_held(self):
+        """Send the notifications in the outbox, until they're all sent or
+        the connection is lost again.
+        """
+        outbox = self._outbox
+        while outbox and not self._down:
+            n, futures = outbox.popleft()
+            try:
+                self._send_or_hold(n, futures, first=True)
+            except Exception:
+                # No-one is waiting to hear about this error.
+                import traceback
+                traceback.print_exc()
+    
+    def _send_or_hold(self, n, futures=[], first=False, args=None):
+        """Show notification *n*, or hold it if the connection has been lost.
+        
+        Returns True if it was sent. *futures* are set to its ID once it's
+        been sent. Other errors are passed to them, or raised if there are
+        none.
+        """
+        if not self._check_connection():
+            self._hold(n, futures, first)
+            return False
+        if args is None:
+            args = n._make_notify_args(self.app_name)
+        listening = False
+        try:
+            listening = self._listen(n)
+            # As in _send(), use the current ID.
+            nid = self._transport.notify(args[:1] + (n._replaces_id(),) +
+                                         args[2:])
+            self._shown(n, nid)
+        except Exception as e:
+            if self._lost(e):
+                self._hold(n, futures, first)
+                return False
+            if not futures:
+                raise
+            for future in futures:
+                if not future.done():
+                    future.set_exception(e)
+            return False
+        finally:
+            if listening:
+                self._done_showing()
+        self._retry_delay = self.reconnect_delay
+        for future in futures:
+            if not future.done():
+                future.set_result(n.id)
+        return True
+    
+    # Server information - cached replies to GetCapabilities and
+    # GetServerInformation; None until they are first needed.
+    
+    def invalidate_server_cache(self):
+        """Forget the cached server capabilities and information. See
+        :func:`notify2.invalidate_server_cache`.
+        """
+        self._server_caps = None
+        self._server_caps_set = frozenset()
+        self._server_info = None
+    
+    def _server_owner_changed(self, new_owner):
+        self.invalidate_server_cache()
+        if new_owner and self._down:
+            # The server has started again, so reconnect and send held
+            # notifications now. The old connection may still be bound to
+            # the server which went away.
+            if self._sender is not None:
+                self._sender.submit(self._server_back)
+            else:
+                self._server_back()
+    
+    def _server_back(self):
+        with self._lock:
+            if self._down:
+                self._retry_at = 0
+                self._check_connection()
+    
+    def _load_server_caps(self, caps):
+        caps = [str(x) for x in caps]
+        self._server_caps_set = frozenset(caps)
+        self._server_caps = caps
+        return caps
+    
+    def _load_server_info(self, res):
+        self._server_info = {'name': str(res[0]),
+                             'vendor': str(res[1]),
+                             'version': str(res[2]),
+                             'spec-version': str(res[3]),
+                            }
+        return self._server_info
+    
+    def get_server_caps(self):
+        """Get a list of server capabilities. See
+        :func:`notify2.get_server_caps`.
+        """
+        caps = self._server_caps
+        if caps is None:
+            caps = self._load_server_caps(
+                self._call_transport('get_capabilities'))
+        return list(caps)
+    
+    def get_server_caps_set(self):
+        """Get server capabilities as a frozenset. See
+        :func:`notify2.get_server_caps_set`.
+        """
+        if self._server_caps is None:
+            self._load_server_caps(self._call_transport('get_capabilities'))
+        return self._server_caps_set
+    
+    def get_server_info(self):
+        """Get basic information about the server. See
+        :func:`notify2.get_server_info`.
+        """
+        info = self._server_info
+        if info is None:
+            info = self._load_server_info(
+                self._call_transport('get_server_information'))
+        return dict(info)
+    
+    # Signals and callbacks
+    
+    def set_callback_executor(self, executor):
+        """Run callbacks from this client's notifications with *executor*.
+        See :func:`notify2.set_callback_executor`.
+        """
+        self._callback_queue = None if executor is None \
+                               else _CallbackQueue(executor)
+    
+    def _action_callback(self, nid, action):
+        nid, action = int(nid), str(action)
+        try:
+            n = self.registry[nid]
+        except KeyError:
+            #this message was created through some other program - or
+            #perhaps by this one, and the reply to Notify isn't handled yet.
+            self._hold_back(nid, self._action_callback, action)
+            return
+        if self._callback_queue is not None:
+            self._callback_queue.put(nid, n._action_callback, action)
+        else:
+            n._action_callback(action)
+    
+    def _closed_callback(self, nid, reason):
+        nid, reason = int(nid), int(reason)
+        n = self.registry.pop(nid, None)
+        if n is None:
+            #this message was created through some other program - or
+            #perhaps by this one, and the reply to Notify isn't handled yet.
+            self._hold_back(nid, self._closed_callback, reason)
+            return
+        if self._callback_queue is not None:
+            self._callback_queue.put(nid, n._closed_callback, n)
+        else:
+            n._closed_callback(n)
+    
+    def _is_tracked(self, nid):
+        # While notifications are waiting for their IDs, any signal could be
+        # about one of them.
+        return (nid in self.registry) or (self._showing > 0)
+    
+    def _hold_back(self, nid, callback, arg):
+        """Keep a signal about an unknown ID while notifications are waiting
+        for their IDs, in case it's about one of them.
+        
+        With a dispatch thread, signals can arrive just after the reply to
+        Notify, before the thread which sent it has recorded the ID.
+        """
+        if not self._showing:
+            return
+        with self._early_lock:
+            if nid not in self.registry:
+                early = self._early_signals
+                early.setdefault(nid, []).append((callback, arg))
+                while len(early) > 64:   # Probably from other programs
+                    del early[next(iter(early))]
+                return
+        callback(nid, arg)   # It's been recorded meanwhile
+    
+    def _subscribe(self):
+        if self._early_lock is None:
+            import threading
+            self._early_lock = threading.Lock()
+        self._connect_lazily()
+        if self._have_mainloop:
+            self._transport.subscribe(self._action_callback,
+                                      self._closed_callback, self._is_tracked)
+        self._subscribed = True
+    
+    def _listen(self, n):
+        """Subscribe to signals from the server if notification *n* needs
+        them, before it's sent, so none are missed.
+        
+        Returns True if it does; call _done_showing() once it's been shown.
+        """
+        if not n._wants_signals():
+            return False
+        with self._lock:
+            if not self._subscribed:
+                self._subscribe()
+            self._showing += 1
+        return True
+    
+    def _done_showing(self):
+        with self._lock:
+            self._showing -= 1
+            if self._showing == 0:
+                # Any left are about other programs' notifications
+                self._early_signals.clear()
+            self._unsubscribe_if_idle()
+    
+    def _unsubscribe_if_idle(self):
+        with self._lock:
+            if self._subscribed and (self._showing == 0) \
+                    and (len(self.registry) == 0):
+                self._subscribed = False
+                if self._have_mainloop and not self._down:
+                    self._transport.unsubscribe()
+    
+    def _registry_emptied(self):
+        if self._sender is not None:
+            # Check again on the sender thread, which may be showing one now.
+            self._sender.submit(self._unsubscribe_if_idle)
+        else:
+            self._unsubscribe_if_idle()
+    
+    # Showing and closing notifications; see the Notification methods.
+    
+    def _show(self, n):
+        if self._sender is not None:
+            args = n._make_notify_args(self.app_name)
+            # Copy the hints, in case they're changed before this is sent.
+            args = args[:6] + (dict(args[6]),) + args[7:]
+            if self._reconnect:
+                # The notification may be held, so its future is only done
+                # once it's sent.
+                future = _make_future()
+                self._sender_for(n).submit(self._send_or_hold, n, [future],
+                                           False, args)
+                return future
+            return self._sender_for(n).submit(self._send, n, args)
+        
+        if self._reconnect:
+            return self._send_or_hold(n)
+        
+        listening = self._listen(n)
+        try:
+            nid = self._transport.notify(n._make_notify_args(self.app_name))
+            self._shown(n, nid)
+        finally:
+            if listening:
+                self._done_showing()
+        return True
+    
+    def _send(self, n, args):
+        """Show a notification from the sender thread, in threaded mode.
+        """
+        listening = self._listen(n)
+        try:
+            # An earlier show() may have been answered since args were made,
+            # so use the current ID to replace that notification.
+            nid = self._transport.notify(args[:1] + (n._replaces_id(),) +
+                                         args[2:])
+            self._shown(n, nid)
+        finally:
+            if listening:
+                self._done_showing()
+        return n.id
+    
+    def _show_async(self, n):
+        if self._sender is not None:
+            return self._show(n)
+        
+        future = _make_future()
+        if self._reconnect and not self._check_connection():
+            self._hold(n, [future])
+            return future
+        listening = self._listen(n)
+        
+        def reply_handler(nid):
+            try:
+                self._shown(n, nid)
+            finally:
+                if listening:
+                    self._done_showing()
+            future.set_result(n.id)
+        
+        def error_handler(e):
+            if listening:
+                self._done_showing()
+            if self._lost(e):
+                self._hold(n, [future])
+            else:
+                future.set_exception(e)
+        
+        try:
+            pending = self._transport.notify_async(
+                n._make_notify_args(self.app_name), reply_handler,
+                error_handler)
+            # Unless it failed at once, and is held
+            if future._pending is None:
+                future._pending = pending
+        except Exception as e:
+            if listening:
+                self._done_showing()
+            if not self._lost(e):
+                raise
+            self._hold(n, [future])
+        return future
+    
+    def _shown(self, n, nid):
+        """Record the ID the server assigned to notification *n*.
+        
+        Only notifications with callbacks are tracked for signals.
+        """
+        n.id = int(nid)
+        n._replaces = None
+        
+        if self._have_mainloop and n._wants_signals():
+            self.registry[n.id] = n
+            if self._early_signals:
+                with self._early_lock:
+                    early = self._early_signals.pop(n.id, ())
+                for callback, arg in early:
+                    callback(n.id, arg)
+    
+    def _close(self, n):
+        if self._sender is not None:
+            return self._sender_for(n).submit(self._close_now, n)
+        self._close_now(n)
+    
+    def _sender_for(self, n):
+        """The sender thread for notification *n*. It's always the same one,
+        so the calls for each notification are made in order.
+        """
+        senders = self._senders
+        if len(senders) == 1:
+            return senders[0]
+        # Objects are 16-byte aligned, so the low bits of id() are the same.
+        return senders[(id(n) >> 4) % len(senders)]
+    
+    def _close_now(self, n):
+        if self._reconnect:
+            self._unhold(n)
+            if not self._check_connection():
+                return   # The server has gone, along with its notifications
+            try:
+                if n.id != 0:
+                    self._transport.close_notification(n.id)
+            except Exception as e:
+                if not self._lost(e):
+                    raise
+            return
+        if n.id != 0:
+            self._transport.close_notification(n.id)
+
+# The client used by the module-level functions, and by notifications which
+# aren't given one.
+_client = NotificationClient(registry=notifications_registry)
+
+# Controlling notifications ----------------------------------------------------
+
+# The D-Bus types of the hints defined in the spec. Other hints are sent with
+# a type guessed from their Python value.
+_hint_signatures = {
+    'action-icons': 'b',
+    'category': 's',
+    'desktop-entry': 's',
+    'image-data': '(iiibiiay)',
+    'image_data': '(iiibiiay)',
+    'icon_data': '(iiibiiay)',
+    'image-path': 's',
+    'image_path': 's',
+    'resident': 'b',
+    'sound-file': 's',
+    'sound-name': 's',
+    'suppress-sound': 'b',
+    'transient': 'b',
+    'urgency': 'y',
+    'x': 'i',
+    'y': 'i',
+}
+
+def _hint_signature(key, value):
+    """Get the D-Bus signature to send a hint value with, or None if there's
+    no obvious one.
+    """
+    sig = _dbus_value_signature(value)
+    if sig is not None:
+        return sig   # A dbus-python value keeps the type it was given
+    try:
+        return _hint_signatures[key]
+    except KeyError:
+        pass
+    if isinstance(value, bool):
+        return 'b'
+    elif isinstance(value, _Byte):
+        return 'y'
+    elif isinstance(value, int):
+        return 'i' if -2**31 <= value < 2**31 else 'x'
+    elif isinstance(value, float):
+        return 'd'
+    elif isinstance(value, _text_types):
+        return 's'
+    elif isinstance(value, bytes):
+        return 'ay'
+    elif isinstance(value, list) and \
+            all(isinstance(v, _text_types) for v in value):
+        return 'as'
+    return None
+
+def _dbus_value_signature(value):
+    """Get the signature of a dbus-python value, or None if it isn't one.
+    """
+    dbus_module = sys.modules.get('dbus')
+    if dbus_module is None:
+        return None
+    for name, sig in _dbus_type_signatures:
+        if isinstance(value, getattr(dbus_module, name)):
+            return sig
+    if isinstance(value, dbus_module.Array) and value.signature:
+        return 'a' + value.signature
+    elif isinstance(value, dbus_module.Struct) and value.signature:
+        return '(' + value.signature + ')'
+    return None
+
+# In the order to check them: Boolean is also an integer type.
+_dbus_type_signatures = [
+    ('Boolean', 'b'), ('Byte', 'y'), ('Int16', 'n'), ('UInt16', 'q'),
+    ('Int32', 'i'), ('UInt32', 'u'), ('Int64', 'x'), ('UInt64', 't'),
+    ('Double', 'd'), ('ObjectPath', 'o'), ('Signature', 'g'),
+    ('String', 's'), ('ByteArray', 'ay'),
+]
+
+def _hint_variant(key, value):
+    """Make a (signature, value) pair for a variant, as jeepney and the
+    socket backend want.
+    """
+    sig = _hint_signature(key, value)
+    if sig is None:
+        raise TypeError("Can't tell which D-Bus type to send hint %r as: use "
+                        "a bool, int, float, str, bytes or list of str, or "
+                        "a dbus-python value (got %s)"
+                        % (key, type(value).__name__))
+    if sig == '(iiibiiay)':
+        if isinstance(value, _Icon):
+            return sig, value   # Ready to send
+        w, h, rowstride, has_alpha, bits_per_sample, channels, data = value
+        value = (w, h, rowstride, bool(has_alpha), bits_per_sample, channels,
+                 _to_bytes(data))
+    elif sig == 'y' and isinstance(value, bytes):
+        value = ord(value)
+    return sig, value
+
+def _to_bytes(data):
+    if isinstance(data, bytes):
+        return data
+    elif isinstance(data, memoryview):
+        return data.tobytes()   # On Python 2, bytes() would give its repr
+    return bytes(data)
+
+def _is_dbus_type(value, name):
+    # A dbus-python value can only exist if dbus-python has been imported.
+    # Checking for that avoids importing it here, e.g. for the socket backend.
+    dbus_module = sys.modules.get('dbus')
+    return (dbus_module is not None) and \
+        isinstance(value, getattr(dbus_module, name))
+
+class _Byte(int):
+    """A byte hint value, for when dbus-python isn't used.
+    """
+    pass
+
+def _byte(value):
+    if isinstance(value, bytes):
+        value = ord(value)
+    return _Byte(value)
+
+class _TemplateHints(dict):
+    """The hints of a :class:`NotificationTemplate`, which keep their
+    conversions for sending, so each is only made once.
+    """
+    __slots__ = ('dbus_hints', 'variants')
+    
+    def __init__(self, hints):
+        dict.__init__(self, hints)
+        self.dbus_hints = self.variants = None
+
+def _hint_variants(hints):
+    """Convert hints to (signature, value) pairs, for the socket backend and
+    jeepney.
+    """
+    if isinstance(hints, _TemplateHints):
+        if hints.variants is None:
+            hints.variants = _hint_variants(dict(hints))
+        return hints.variants
+    return dict((k, _hint_variant(k, v)) for k, v in hints.items())
+
+def _dbus_hints(hints):
+    """Convert hint values to dbus-python types, for sending with
+    dbus-python.
+    
+    Hints are stored as plain Python values, so that making notifications
+    doesn't depend on which backend is used, nor import dbus-python.
+    """
+    if _is_dbus_type(hints, 'Dictionary'):
+        return hints   # Converted already
+    if isinstance(hints, _TemplateHints):
+        if hints.dbus_hints is None:
+            hints.dbus_hints = _dbus_hints(dict(hints))
+        return hints.dbus_hints
+    return dbus.Dictionary(dict((key, _dbus_hint_value(key, value))
+                                for key, value in hints.items()),
+                           signature='sv')
+
+def _dbus_hint_value(key, value):
+    """Convert a hint value to a dbus-python type.
+    
+    dbus-python values are passed on as they are, as are values without an
+    obvious type, for dbus-python to work out.
+    """
+    if _dbus_value_signature(value) is not None:
+        return value
+    sig = _hint_signature(key, value)
+    if sig is None:
+        return value
+    elif sig == '(iiibiiay)':
+        if isinstance(value, _Icon):
+            if value.dbus_struct is None:
+                value.dbus_struct = _dbus_icon_struct(value)
+            return value.dbus_struct
+        return _dbus_icon_struct(value)
+    elif sig == 'as':
+        return dbus.Array(value, signature='s')
+    elif sig == 'y' and isinstance(value, bytes):
+        return dbus.Byte(ord(value))
+    return getattr(dbus, _dbus_type_names[sig])(value)
+
+def _dbus_icon_struct(value):
+    w, h, rowstride, has_alpha, bits_per_sample, channels, data = value
+    return dbus.Struct((dbus.Int32(w), dbus.Int32(h), dbus.Int32(rowstride),
+                        dbus.Boolean(has_alpha), dbus.Int32(bits_per_sample),
+                        dbus.Int32(channels), dbus.ByteArray(data)),
+                       signature='iiibiiay')
+
+_dbus_type_names = {'b': 'Boolean', 'y': 'Byte', 'i': 'Int32', 'x': 'Int64',
+                    'd': 'Double', 's': 'String', 'ay': 'ByteArray'}
+
+# Scaled icons, keyed by a hash of the original pixels and their layout.
+# Servers show icons at about 48-64 pixels, so sending bigger images is
+# wasteful; scaling is slow, though, so we cache the results. Notifications
+# setting the same icon share the _Icon, and so the image-data struct
+# prepared for dbus-python when the first of them is sent.
+icon_cache_size = 32
+_icon_cache = ActionsDictClass()
+
+class _Icon(tuple):
+    """An icon hint value: (width, height, rowstride, has_alpha,
+    bits_per_sample, channels, data), as the spec's image-data struct.
+    
+    The dbus-python struct for it is kept once it's made, so showing the
+    notification again doesn't copy the pixels again.
+    """
+    dbus_struct = None
+
+def _icon_struct(data, width, height, rowstride, has_alpha, bits_per_sample,
+                 channels):
+    return _Icon((width, height, rowstride, bool(has_alpha), bits_per_sample,
+                  channels, _to_bytes(data)))
+
+def _downscale(data, width, height, rowstride, channels, max_size):
+    """Shrink 8-bit pixel data to fit in max_size x max_size.
+    
+    Returns (data, width, height, rowstride) for the new image, with rows
+    packed. This averages the pixels in each box if NumPy is available, and
+    otherwise takes the pixel in the middle of each box.
+    """
+    scale = float(max_size) / max(width, height)
+    new_w = max(1, int(round(width * scale)))
+    new_h = max(1, int(round(height * scale)))
+    row_bytes = width * channels
+    
+    try:
+        import numpy as np
+    except ImportError:
+        pass
+    else:
+        buf = np.frombuffer(data, dtype=np.uint8)
+        rows = np.lib.stride_tricks.as_strided(buf, (height, row_bytes),
+                                               (rowstride, 1))
+        img = rows.reshape(height, width, channels).astype(np.uint32)
+        ys = (np.arange(new_h) * height) // new_h
+        xs = (np.arange(new_w) * width) // new_w
+        sums = np.add.reduceat(np.add.reduceat(img, ys, axis=0), xs, axis=1)
+        counts = np.outer(np.diff(np.append(ys, height)),
+                          np.diff(np.append(xs, width)))
+        small = (sums + counts[:, :, None] // 2) // counts[:, :, None]
+        return (small.astype(np.uint8).tobytes(), new_w, new_h,
+                new_w * channels)
+    
+    data = memoryview(data)
+    x_offsets = [((2 * x + 1) * width // (2 * new_w)) * channels
+                 for x in range(new_w)]
+    out = []
+    for y in range(new_h):
+        start = ((2 * y + 1) * height // (2 * new_h)) * rowstride
+        row = data[start:start + row_bytes].tobytes()
+        out.extend(row[x:x + channels] for x in x_offsets)
+    return b''.join(out), new_w, new_h, new_w * channels
+
+def _encode_png(data, width, height, rowstride, channels, has_alpha=True):
+    """Encode 8-bit RGB or RGBA pixel data as a PNG file.
+    
+    Four channels without alpha (RGBx) are saved as RGB, dropping the
+    padding byte.
+    """
+    data = memoryview(data)
+    row_bytes = width * channels
+    rows = [data[y * rowstride:y * rowstride + row_bytes].tobytes()
+            for y in range(height)]
+    if channels == 4 and not has_alpha:
+        for i, row in enumerate(rows):
+            rgb = bytearray(width * 3)
+            rgb[0::3] = row[0::4]
+            rgb[1::3] = row[1::4]
+            rgb[2::3] = row[2::4]
+            rows[i] = bytes(rgb)
+        channels = 3
+    raw = b''.join(b'\0' + row for row in rows)
+    
+    def chunk(tag, body):
+        return (struct.pack('>I', len(body)) + tag + body +
+                struct.pack('>I', zlib.crc32(tag + body) & 0xffffffff))
+    
+    try:
+        colour_type = {3: 2, 4: 6}[channels]
+    except KeyError:
+        raise ValueError("Can only save icons with 3 or 4 channels", channels)
+    return (b'\x89PNG\r\n\x1a\n' +
+            chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8,
+                                       colour_type, 0, 0, 0)) +
+            chunk(b'IDAT', zlib.compress(raw)) +
+            chunk(b'IEND', b''))
+
+class IconFileCache(object):
+    """A directory of icon files, so icons can be sent as a short path
+    instead of all of their pixels.
+    
+    To use it, set ``notify2.icon_file_cache = notify2.IconFileCache()``.
+    Icons set by :meth:`Notification.set_icon_from_buffer` and
+    :meth:`Notification.set_icon_from_pixbuf` are then saved as PNG files,
+    named by the hash of their pixels, and each is only written once.
+    
+    directory : str
+      Where to store the files. The default is ``notify2/icons`` in
+      ``$XDG_CACHE_HOME`` (``~/.cache``).
+    max_bytes : int
+      When the files take up more than this, the least recently used ones
+      are deleted.
+    """
+    def __init__(self, directory=None, max_bytes=16 * 1024 * 1024):
+        if directory is None:
+            cache_home = os.environ.get('XDG_CACHE_HOME') or \
+                         os.path.join(os.path.expanduser('~'), '.cache')
+            directory = os.path.join(cache_home, 'notify2', 'icons')
+        self.directory = directory
+        self.max_bytes = max_bytes
+    
+    def store(self, data, width, height, rowstride, channels, max_size=None,
+              has_alpha=True):
+        """Save 8-bit pixel data as a PNG file if it isn't already cached,
+        and return the path to it.
+        
+        If *max_size* is given, bigger images are scaled down to fit. If
+        *has_alpha* is false, the 4th of 4 channels is ignored.
+        """
+        import hashlib
+        has_alpha = bool(has_alpha) and channels == 4
+        key = hashlib.sha1(data)
+        key.update(struct.pack('>IIIII?', width, height, rowstride, channels,
+                               max_size or 0, has_alpha))
+        path = os.path.join(self.directory, key.hexdigest() + '.png')
+        try:
+            os.utime(path, None)   # Mark it as recently used
+            return path
+        except OSError:
+            pass
+        
+        if (max_size is not None) and (max(width, height) > max_size):
+            data, width, height, rowstride = _downscale(data, width, height,
+                                                        rowstride, channels,
+                                                        max_size)
+        png = _encode_png(data, width, height, rowstride, channels,
+                          has_alpha)
+        
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory, 0o700)
+        tmp_path = '%s.%d.tmp' % (path, os.getpid())
+        with open(tmp_path, 'wb') as f:
+            f.write(png)
+        os.rename(tmp_path, path)
+        
+        self._evict(keep=path)
+        return path
+    
+    def _evict(self, keep):
+        """Delete the least recently used files until they fit in max_bytes.
+        """
+        files = []
+        total = 0
+        for name in os.listdir(self.directory):
+            if not name.endswith('.png'):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            files.append((st.st_mtime, st.st_size, path))
+            total += st.st_size
+        
+        files.sort()
+        for mtime, size, path in files:
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+icon_file_cache = None
+
+
+class Notification(object):
+    """A notification object.
+    
+    summary : str
+      The title text
+    message : str
+      The body text, if the server has the 'body' capability.
+    icon : str
+      Path to an icon image, or the name of a stock icon. Stock icons available
+      in Ubuntu are `listed here <https://wiki.ubuntu.com/NotificationDevelopmentGuidelines#How_do_I_get_these_slick_icons>`_.
+      You can also set an icon from data in your application - see
+      :meth:`set_icon_from_pixbuf`.
+    client : NotificationClient
+      The client to show the notification with. The default (None) is the
+      one set up by :func:`init`. Notifications shown with
+      :func:`notify2.aio.show` can have a
+      :class:`~notify2.aio.AsyncNotificationClient` instead.
+    
+    Notifications use ``__slots__`` to keep them small, and the ``hints``,
+    ``actions`` and ``data`` containers are only created when they're first
+    used. Subclasses without ``__slots__`` can set other attributes as usual.
+    """
+    __slots__ = ('id', 'timeout', 'summary', 'message', 'icon',
+                 'client', '_hints', '_actions', '_data', '_closed_callback',
+                 '_template', '_replaces', '__weakref__')
+    
+    def __init__(self, summary, message='', icon='', client=None):
+        if type(self) is Notification:
+            self.id = 0
+            self.timeout = EXPIRES_DEFAULT   # server default settings
+            self._closed_callback = no_op
+        else:
+            self._set_defaults()
+        self.summary = summary
+        self.message = message
+        self.icon = icon
+        self.client = client
+        self._hints = None
+        self._actions = None
+        self._data = None
+        self._template = None
+        self._replaces = None
+    
+    def _set_defaults(self):
+        # Before Notification used __slots__, these were class attributes, so
+        # subclasses may override them as class attributes.
+        cls = type(self)
+        for name, value in (('id', 0), ('timeout', EXPIRES_DEFAULT),
+                            ('_closed_callback', no_op)):
+            if type(getattr(cls, name)) is _slot_type:   # Not overridden
+                setattr(self, name, value)
+    
+    @property
+    def hints(self):
+        hints = self._hints
+        if hints is None:
+            self._hints = hints = {}
+        elif (self._template is not None) and (hints is self._template.hints):
+            # Shared with the template (see NotificationTemplate.new), so
+            # copy it before it can be changed.
+            self._hints = hints = dict(hints)
+        return hints
+    
+    @hints.setter
+    def hints(self, value):
+        self._hints = value
+    
+    @property
+    def actions(self):
+        actions = self._actions
+        if actions is None:
+            self._actions = actions = ActionsDictClass()
+        elif (self._template is not None) and \
+                (actions is self._template.actions):
+            # As for hints. The template's actions array no longer matches,
+            # so _make_notify_args() makes a new one.
+            self._actions = actions = actions.copy()
+        return actions
+    
+    @actions.setter
+    def actions(self, value):
+        self._actions = value
+    
+    @property
+    def data(self):
+        """Any data the user wants to attach."""
+        if self._data is None:
+            self._data = {}
+        return self._data
+    
+    @data.setter
+    def data(self, value):
+        self._data = value
+    
+    def show(self):
+        """Ask the server to show the notification.
+        
+        Call this after you have finished setting any parameters of the
+        notification that you want.
+        
+        In threaded mode (see :func:`init`), this returns a
+        :class:`concurrent.futures.Future` for the notification ID instead of
+        waiting for the server.
+        """
+        return self._get_client()._show(self)
+    
+    def show_async(self):
+        """Ask the server to show the notification, without waiting for it
+        to reply.
+        
+        Returns a :class:`concurrent.futures.Future` which resolves to the
+        notification ID. :attr:`id` is set when the reply arrives, so wait for
+        the future before calling :meth:`show` again to replace this
+        notification. If there is a mainloop, it delivers the reply; otherwise,
+        calling ``result()`` on the future waits for it. A *timeout* passed to
+        ``result()`` is kept to with the socket backend; dbus-python can only
+        wait until the reply arrives or the call times out.
+        
+        In threaded mode, this is the same as :meth:`show`.
+        """
+        return self._get_client()._show_async(self)
+    
+    def _get_client(self):
+        return _client if self.client is None else self.client
+    
+    def _make_notify_args(self, app_name):
+        """Make the arguments for the Notify method call.
+        """
+        t = self._template
+        if (t is not None) and (self._hints is t.hints) \
+                and (self._actions is t.actions):
+            actions = t.actions_array
+        else:
+            actions = self._make_actions_array()
+        replaces_id = self._replaces_id()
+        return (app_name,      # app_name       (spec names)
+                replaces_id,   # replaces_id
+                self.icon,     # app_icon
+                self.summary,  # summary
+                self.message,  # body
+                actions,       # actions
+                self._hints if self._hints is not None else {},  # hints
+                self.timeout,  # expire_timeout
+               )
+    
+    def _replaces_id(self):
+        """The ID of the notification to replace: this one's, once it's been
+        shown, or else that of the notification :class:`CoalescingSender`
+        told it to replace, which may only have been shown since.
+        """
+        if (self.id == 0) and (self._replaces is not None):
+            return self._replaces.id
+        return self.id
+    
+    def _wants_signals(self):
+        """Does this notification have any callbacks?
+        """
+        return bool(self._actions) or (self._closed_callback is not no_op)
+    
+    def update(self, summary, message="", icon=None):
+        """Replace the summary and body of the notification, and optionally its
+        icon. You should call :meth:`show` again after this to display the
+        updated notification.
+        """
+        self.summary = summary
+        self.message = message
+        if icon is not None:
+            self.icon = icon
+    
+    def close(self):
+        """Ask the server to close this notification.
+        
+        In threaded mode (see :func:`init`), this returns a
+        :class:`concurrent.futures.Future` which is done when the server has
+        replied.
+        """
+        return self._get_client()._close(self)
+    
+    def set_hint(self, key, value):
+        """n.set_hint(key, value) <--> n.hints[key] = value
+        
+        See `hints in the spec <http://people.gnome.org/~mccann/docs/notification-spec/notification-spec-latest.html#hints>`_.
+        
+        Only exists for compatibility with pynotify.
+        """
+        self.hints[key] = value
+    
+    set_hint_string = set_hint_int32 = set_hint_double = set_hint
+    
+    def set_hint_byte(self, key, value):
+        """Set a hint with a dbus byte value. The input value can be an
+        integer or a bytes string of length 1.
+        """
+        self.hints[key] = _byte(value)
+    
+    def set_urgency(self, level):
+        """Set the urgency level to one of URGENCY_LOW, URGENCY_NORMAL or
+        URGENCY_CRITICAL.
+        """
+        if level not in urgency_levels:
+            raise ValueError("Unknown urgency level specified", level)
+        self.set_hint_byte("urgency", level)
+    
+    def set_category(self, category):
+        """Set the 'category' hint for this notification.
+        
+        See `categories in the spec <http://people.gnome.org/~mccann/docs/notification-spec/notification-spec-latest.html#categories>`_.
+        """
+        self.hints['category'] = category
+    
+    def set_timeout(self, timeout):
+        """Set the display duration in milliseconds, or one of the special
+        values EXPIRES_DEFAULT or EXPIRES_NEVER. This is a request, which the
+        server might ignore.
+        
+        Only exists for compatibility with pynotify; you can simply set::
+        
+          n.timeout = 5000
+        """
+        if not isinstance(timeout, int):
+            raise TypeError("timeout value was not int", timeout)
+        self.timeout = timeout
+    
+    def get_timeout(self):
+        """Return the timeout value for this notification.
+        
+        Only exists for compatibility with pynotify; you can inspect the
+        timeout attribute directly.
+        """
+        return self.timeout
+    
+    def add_action(self, action, label, callback, user_data=None):
+        """Add an action to the notification.
+        
+        Check for the 'actions' server capability before using this.
+        
+        action : str
+          A brief key.
+        label : str
+          The text displayed on the action button
+        callback : callable
+          A function taking at 2-3 parameters: the Notification object, the
+          action key and (if specified) the user_data.
+        user_data :
+          An extra argument to pass to the callback.
+        """
+        self.actions[action] = (label, callback, user_data)
+    
+    def _make_actions_array(self):
+        """Make the actions array to send over DBus.
+        """
+        arr = []
+        if not self._actions:
+            return arr
+        for action, (label, callback, user_data) in self._actions.items():
+            arr.append(action)
+            arr.append(label)
+        return arr
+    
+    def _action_callback(self, action):
+        """Called when the user selects an action on the notification, to
+        dispatch it to the relevant user-specified callback.
+        """
+        if not self._actions:
+            return
+        try:
+            label, callback, user_data = self._actions[action]
+        except KeyError:
+            return
+        
+        if user_data is None:
+            return callback(self, action)
+        else:
+            return callback(self, action, user_data)
+    
+    def connect(self, event, callback):
+        """Set the callback for the notification closing; the only valid value
+        for event is 'closed' (the parameter is kept for compatibility with pynotify).
+        
+        The callback will be called with the :class:`Notification` instance.
+        """
+        if event != 'closed':
+            raise ValueError("'closed' is the only valid value for event", event)
+        self._closed_callback = callback
+    
+    def set_data(self, key, value):
+        """n.set_data(key, value) <--> n.data[key] = value
+        
+        Only exists for compatibility with pynotify.
+        """
+        self.data[key] = value
+    
+    def get_data(self, key):
+        """n.get_data(key) <--> n.data[key]
+        
+        Only exists for compatibility with pynotify.
+        """
+        return self.data[key]
+
+    def set_icon_from_pixbuf(self, icon, max_size=None):
+        """Set a custom icon from a GdkPixbuf.
+        
+        If *max_size* is given, a larger image is scaled down to fit, as for
+        :meth:`set_icon_from_buffer`.
+        """
+        self.set_icon_from_buffer(icon.get_pixels(),
+                                  icon.get_width(),
+                                  icon.get_height(),
+                                  rowstride=icon.get_rowstride(),
+                                  has_alpha=icon.get_has_alpha(),
+                                  bits_per_sample=icon.get_bits_per_sample(),
+                                  channels=icon.get_n_channels(),
+                                  max_size=max_size)
+    
+    def set_icon_from_buffer(self, data, width, height, rowstride=None,
+                             has_alpha=True, bits_per_sample=8, channels=None,
+                             max_size=None):
+        """Set a custom icon from raw pixel data.
+        
+        data :
+          The pixels, as any object supporting the buffer protocol: bytes,
+          a memoryview, an mmap, a NumPy array, etc. Rows are laid out one
+          after the other, *rowstride* bytes apart, as in a GdkPixbuf.
+        width, height : int
+          The size of the image in pixels.
+        rowstride : int
+          The number of bytes from the start of one row to the start of the
+          next. The default assumes rows are packed without padding.
+        has_alpha : bool
+          Whether the pixels have an alpha channel.
+        bits_per_sample : int
+          Bits per colour channel; the spec only allows 8.
+        channels : int
+          Samples per pixel; the default is 4 with alpha, 3 without.
+        max_size : int
+          If given, an image wider or taller than this is scaled down to fit,
+          keeping its aspect ratio. Servers typically show icons at 48-64
+          pixels, so this saves sending large images over D-Bus. Scaled icons
+          are cached by the hash of their pixels, so setting the same icon
+          again is cheap (see ``notify2.icon_cache_size``).
+        
+        The pixels are copied into a bytes object just once, unless *data* is
+        already one, and the icon is stored ready to send, so showing the
+        notification again doesn't convert it again.
+        
+        If ``notify2.icon_file_cache`` is set to an :class:`IconFileCache`,
+        the icon is saved there instead, and the notification refers to the
+        file with the 'image-path' hint.
+        """
+        if channels is None:
+            channels = 4 if has_alpha else 3
+        if rowstride is None:
+            rowstride = width * channels * bits_per_sample // 8
+        
+        if not _is_dbus_type(data, 'ByteArray'):
+            try:
+                data = memoryview(data)
+            except TypeError:
+                if sys.version_info[0] >= 3:
+                    raise
+                # Python 2 objects with only the old buffer interface
+                data = memoryview(bytes(buffer(data)))
+            if data.ndim != 1 or data.itemsize != 1:
+                # Python 2's memoryview can't be cast, so copy the bytes
+                if getattr(data, 'c_contiguous', False):
+                    data = data.cast('B')
+                else:
+                    data = memoryview(data.tobytes())
+        
+        needed = rowstride * (height - 1) + \
+                 (width * channels * bits_per_sample + 7) // 8
+        if len(data) < needed:
+            raise ValueError("Icon data is too short: expected at least %d "
+                             "bytes, got %d" % (needed, len(data)))
+        
+        if icon_file_cache is not None:
+            if bits_per_sample != 8:
+                raise ValueError("Can only save icons with 8 bits per sample",
+                                 bits_per_sample)
+            self.hints.pop('icon_data', None)
+            self.hints['image-path'] = icon_file_cache.store(
+                data, width, height, rowstride, channels, max_size, has_alpha)
+            return
+        
+        # The server would show an image-path from an earlier call instead
+        self.hints.pop('image-path', None)
+        
+        if (max_size is not None) and (max(width, height) > max_size):
+            if bits_per_sample != 8:
+                raise ValueError("Can only scale icons with 8 bits per sample",
+                                 bits_per_sample)
+            import hashlib
+            key = (hashlib.sha1(data).digest(), width, height, rowstride,
+                   bool(has_alpha), channels, max_size)
+            icon = _icon_cache.pop(key, None)
+            if icon is None:
+                small, w, h, stride = _downscale(data, width, height,
+                                                 rowstride, channels, max_size)
+                icon = _icon_struct(small, w, h, stride,
+                                    has_alpha, bits_per_sample, channels)
+            _icon_cache[key] = icon   # (Re-)insert as the newest entry
+            while len(_icon_cache) > icon_cache_size:
+                del _icon_cache[next(iter(_icon_cache))]
+            self.hints['icon_data'] = icon
+            return
+        
+        self.hints['icon_data'] = _icon_struct(data, width, height, rowstride,
+                                               has_alpha, bits_per_sample,
+                                               channels)
+    
+    def set_location(self, x, y):
+        """Set the notification location as (x, y), if the server supports it.
+        """
+        if (not isinstance(x, int)) or (not isinstance(y, int)):
+            raise TypeError("x and y must both be ints", (x,y))
+        self.hints['x'] = x
+        self.hints['y'] = y
+
+# The type of the descriptors for Notification's slots
+_slot_type = type(Notification.timeout)
+
+class NotificationTemplate(object):
+    """Settings shared by many notifications, prepared once.
+    
+    Make a :class:`Notification` with the icon, hints, actions, timeout and
+    closed callback you want, and pass it to the template. Notifications made
+    by :meth:`new` then only need their summary and body filled in::
+    
+        proto = notify2.Notification("", icon="dialog-warning")
+        proto.set_urgency(notify2.URGENCY_CRITICAL)
+        proto.add_action("ack", "Acknowledge", acknowledge_cb)
+        template = notify2.NotificationTemplate(proto)
+        
+        template.new("Disk full", "/var is 98% full").show()
+    
+    The notifications share the template's hints and actions until they're
+    changed: using ``n.hints`` or ``n.actions``, directly or through methods
+    such as :meth:`~Notification.set_urgency` and
+    :meth:`~Notification.add_action`, first gives that notification its own
+    copy. The shared hints are converted for sending the first time they're
+    sent, and the template keeps the result, so don't change the template's
+    own attributes after making it.
+    """
+    def __init__(self, notification):
+        self.icon = notification.icon
+        self.timeout = notification.timeout
+        self.client = notification.client
+        self.closed_callback = notification._closed_callback
+        self.actions = notification.actions.copy()
+        self.actions_array = notification._make_actions_array()
+        self.hints = _TemplateHints(notification.hints)
+    
+    def new(self, summary, message=''):
+        """Make a :class:`Notification` from this template.
+        """
+        n = Notification(summary, message, self.icon, self.client)
+        n.hints = self.hints
+        n.actions = self.actions
+        n.timeout = self.timeout
+        n._closed_callback = self.closed_callback
+        n._template = self
+        return n
+
+# Sending many notifications ---------------------------------------------------
+
+def show_many(notifications):
+    """Show several notifications, sending all of the requests to the server
+    before waiting for any of the replies.
+    
+    This is quicker than calling :meth:`Notification.show` for each one, as
+    the time it takes the server to reply isn't added up for every
+    notification. Returns a list of the notification IDs, in the same order.
+    If the server returns an error for any notification, it is raised once all
+    the requests have been sent.
+    """
+    futures = [n.show_async() for n in notifications]
+    return [f.result() for f in futures]
+
+class CoalescingSender(object):
+    """Show notifications with a rate limit, merging ones that are related.
+    
+    This protects the notification server from floods of notifications, e.g.
+    when many alerts fire at once.
+    
+    window : float
+      Notifications sent with the same key within this many seconds of each
+      other update one popup, by replacing the previous notification, instead
+      of each making a new popup.
+    rate : float
+      The sustained number of notifications per second to send, or None for
+      no limit.
+    burst : int
+      How many notifications can be sent at once before the rate limit applies.
+    max_pending : int
+      How many notifications to hold back when over the rate limit. Beyond
+      this, the oldest held notifications are discarded.
+    
+    Notifications held back by the rate limit are sent by later calls to
+    :meth:`send` or :meth:`flush`. If several are held with the same key, only
+    the newest is sent.
+    
+    In threaded mode, a notification replaces the previous one with its key
+    even if that is still waiting to be sent, as long as there's only one
+    connection: with several, they may be sent out of order.
+    """
+    _clock = staticmethod(_monotonic)
+    
+    def __init__(self, window=5.0, rate=None, burst=10, max_pending=100):
+        self.window = window
+        self.rate = rate
+        self.burst = burst
+        self.max_pending = max_pending
+        self._tokens = burst
+        self._last_refill = self._clock()
+        self._recent = {}   # key -> (notification, time shown)
+        self._pending = ActionsDictClass()   # key -> (user key, notification)
+    
+    def send(self, notification, key=None):
+        """Show *notification*, or hold it back if over the rate limit.
+        
+        *key* identifies related notifications to be coalesced; None means
+        this notification is not related to any others.
+        
+        Returns True if the notification was sent, or False if it was held
+        back.
+        """
+        self.flush()
+        pending_key = notification if key is None else key
+        if self._pending or not self._take_token():
+            self._pending.pop(pending_key, None)
+            self._pending[pending_key] = (key, notification)
+            while len(self._pending) > self.max_pending:
+                del self._pending[next(iter(self._pending))]
+            return False
+        
+        self._show(notification, key)
+        return True
+    
+    def flush(self):
+        """Send held notifications, as far as the rate limit allows.
+        
+        Call this periodically (e.g. from a timer in your event loop) if
+        notifications may be held back. Returns the number still held.
+        """
+        while self._pending and self._take_token():
+            pending_key = next(iter(self._pending))
+            key, notification = self._pending.pop(pending_key)
+            self._show(notification, key)
+        return len(self._pending)
+    
+    def _take_token(self):
+        if self.rate is None:
+            return True
+        now = self._clock()
+        self._tokens = min(self.burst,
+                           self._tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return True
+        return False
+    
+    def _show(self, notification, key):
+        if key is None:
+            notification.show()
+            return
+        
+        now = self._clock()
+        for k, (n, shown) in list(self._recent.items()):
+            if now - shown > self.window:
+                del self._recent[k]
+        
+        try:
+            previous, shown = self._recent[key]
+        except KeyError:
+            pass
+        else:
+            # Replace the previous popup, through the replaces_id parameter.
+            # In threaded mode, or while reconnecting, the previous one may
+            # not have been sent yet, so its ID is looked up when this one is.
+            if previous.id != 0:
+                notification.id = previous.id
+            elif previous is not notification:
+                notification._replaces = previous
+        notification.show()
+        self._recent[key] = (notification, now)
@@ -0,0 +1,783 @@
+"""A small D-Bus client speaking the wire protocol directly over a socket.
+
+This is used by ``notify2.init(backend='socket')``, so that notify2 can work
+without dbus-python. It only implements what notify2 needs: EXTERNAL
+authentication over a UNIX socket, method calls, and receiving signals.
+
+The marshaller covers the basic D-Bus types, arrays, structs, dict entries and
+variants. Variants are written from (signature, value) pairs, and read as
+plain values.
+"""
+
+import collections
+import os
+import select
+import socket
+import struct
+import threading
+import time
+import traceback
+
+_monotonic = getattr(time, 'monotonic', time.time)
+
+# Message types
+METHOD_CALL = 1
+METHOD_RETURN = 2
+ERROR = 3
+SIGNAL = 4
+
+NO_REPLY_EXPECTED = 0x1
+
+# Header fields
+PATH = 1
+INTERFACE = 2
+MEMBER = 3
+ERROR_NAME = 4
+REPLY_SERIAL = 5
+DESTINATION = 6
+SENDER = 7
+SIGNATURE = 8
+
+_header_field_types = {
+    PATH: 'o', INTERFACE: 's', MEMBER: 's', ERROR_NAME: 's',
+    REPLY_SERIAL: 'u', DESTINATION: 's', SENDER: 's', SIGNATURE: 'g',
+}
+
+BUS_NAME = 'org.freedesktop.DBus'
+BUS_PATH = '/org/freedesktop/DBus'
+BUS_INTERFACE = 'org.freedesktop.DBus'
+
+#: Seconds to wait for a reply before giving up, as dbus-python does.
+DEFAULT_TIMEOUT = 25.0
+
+class DBusError(Exception):
+    """An error reply to a method call, or a failure in the connection.
+    """
+    def __init__(self, name, message=''):
+        Exception.__init__(self, name, message)
+        self.name = name
+        self.message = message
+
+    def get_dbus_name(self):
+        # Matches dbus.DBusException
+        return self.name
+
+    def __str__(self):
+        return '%s: %s' % (self.name, self.message)
+
+# Marshalling ------------------------------------------------------------------
+
+# Fixed size types: struct format and size (which is also the alignment)
+_fixed_types = {
+    'y': ('B', 1), 'b': ('I', 4), 'n': ('h', 2), 'q': ('H', 2),
+    'i': ('i', 4), 'u': ('I', 4), 'x': ('q', 8), 't': ('Q', 8),
+    'd': ('d', 8), 'h': ('I', 4),
+}
+
+def _alignment(t):
+    if isinstance(t, tuple):
+        return 4 if t[0] == 'a' else 8
+    if t in _fixed_types:
+        return _fixed_types[t][1]
+    return 4 if t in 'so' else 1   # 'g' and 'v' are byte aligned
+
+_parsed_signatures = {}
+
+def parse_signature(sig):
+    """Parse a signature into a list of type codes.
+
+    Basic types are represented by their character. Arrays are ('a', element),
+    structs are ('(', [fields]), and dict entries are ('{', key, value).
+    """
+    try:
+        return _parsed_signatures[sig]
+    except KeyError:
+        pass
+
+    types = []
+    pos = 0
+    while pos < len(sig):
+        t, pos = _parse_one(sig, pos)
+        types.append(t)
+    _parsed_signatures[sig] = types
+    return types
+
+def _parse_one(sig, pos):
+    c = sig[pos]
+    if c == 'a':
+        elem, pos = _parse_one(sig, pos + 1)
+        return ('a', elem), pos
+    elif c == '(':
+        fields = []
+        pos += 1
+        while sig[pos] != ')':
+            t, pos = _parse_one(sig, pos)
+            fields.append(t)
+        return ('(', fields), pos + 1
+    elif c == '{':
+        key, pos = _parse_one(sig, pos + 1)
+        value, pos = _parse_one(sig, pos)
+        if sig[pos] != '}':
+            raise ValueError("Bad dict entry in signature %r" % sig)
+        return ('{', key, value), pos + 1
+    elif (c in _fixed_types) or (c in 'sogv'):
+        return c, pos + 1
+    raise ValueError("Unknown type %r in signature %r" % (c, sig))
+
+def _pad(buf, alignment):
+    buf.extend(b'\0' * (-len(buf) % alignment))
+
+def _write(buf, t, value):
+    if isinstance(t, tuple):
+        if t[0] == 'a':
+            _write_array(buf, t[1], value)
+        else:   # Struct or dict entry
+            _pad(buf, 8)
+            fields = t[1] if t[0] == '(' else t[1:]
+            for field_type, field_value in zip(fields, value):
+                _write(buf, field_type, field_value)
+    elif t in _fixed_types:
+        fmt, size = _fixed_types[t]
+        _pad(buf, size)
+        buf.extend(struct.pack('<' + fmt, value))
+    elif t in 'so':
+        data = value.encode('utf-8')
+        _pad(buf, 4)
+        buf.extend(struct.pack('<I', len(data)))
+        buf.extend(data)
+        buf.append(0)
+    elif t == 'g':
+        data = value.encode('ascii')
+        buf.append(len(data))
+        buf.extend(data)
+        buf.append(0)
+    elif t == 'v':
+        sig, value = value
+        _write(buf, 'g', sig)
+        types = parse_signature(sig)
+        if len(types) != 1:
+            raise ValueError("Variant signature must be a single type", sig)
+        _write(buf, types[0], value)
+
+def _write_array(buf, elem, value):
+    _pad(buf, 4)
+    length_pos = len(buf)
+    buf.extend(b'\0\0\0\0')
+    _pad(buf, _alignment(elem))
+    start = len(buf)
+    if elem == 'y':
+        buf.extend(value)   # Any buffer, copied straight into the message
+    elif isinstance(elem, tuple) and elem[0] == '{':
+        for item in value.items():
+            _write(buf, elem, item)
+    else:
+        for item in value:
+            _write(buf, elem, item)
+    struct.pack_into('<I', buf, length_pos, len(buf) - start)
+
+def marshal(sig, values):
+    """Marshal a sequence of values with the given signature to a bytearray.
+    """
+    buf = bytearray()
+    types = parse_signature(sig)
+    if len(types) != len(values):
+        raise ValueError("Signature %r needs %d values, got %d"
+                         % (sig, len(types), len(values)))
+    for t, value in zip(types, values):
+        _write(buf, t, value)
+    return buf
+
+def _read(buf, pos, t, endian):
+    if isinstance(t, tuple):
+        if t[0] == 'a':
+            return _read_array(buf, pos, t[1], endian)
+        pos += -pos % 8
+        fields = t[1] if t[0] == '(' else t[1:]
+        res = []
+        for field_type in fields:
+            value, pos = _read(buf, pos, field_type, endian)
+            res.append(value)
+        return tuple(res), pos
+    elif t in _fixed_types:
+        fmt, size = _fixed_types[t]
+        pos += -pos % size
+        value, = struct.unpack_from(endian + fmt, buf, pos)
+        if t == 'b':
+            value = bool(value)
+        return value, pos + size
+    elif t in 'so':
+        pos += -pos % 4
+        length, = struct.unpack_from(endian + 'I', buf, pos)
+        pos += 4
+        return bytes(buf[pos:pos + length]).decode('utf-8'), pos + length + 1
+    elif t == 'g':
+        length = buf[pos]
+        pos += 1
+        return bytes(buf[pos:pos + length]).decode('ascii'), pos + length + 1
+    elif t == 'v':
+        sig, pos = _read(buf, pos, 'g', endian)
+        return _read(buf, pos, parse_signature(sig)[0], endian)
+
+def _read_array(buf, pos, elem, endian):
+    pos += -pos % 4
+    length, = struct.unpack_from(endian + 'I', buf, pos)
+    pos += 4
+    pos += -pos % _alignment(elem)
+    end = pos + length
+    if elem == 'y':
+        return bytes(buf[pos:end]), end
+    res = []
+    while pos < end:
+        value, pos = _read(buf, pos, elem, endian)
+        res.append(value)
+    if isinstance(elem, tuple) and elem[0] == '{':
+        res = dict(res)
+    return res, end
+
+def unmarshal(sig, buf, endian='<'):
+    """Read the values described by the signature from buf.
+    """
+    pos = 0
+    res = []
+    for t in parse_signature(sig):
+        value, pos = _read(buf, pos, t, endian)
+        res.append(value)
+    return tuple(res)
+
+# Messages ---------------------------------------------------------------------
+
+class Message(object):
+    """A D-Bus message. The body is unmarshalled on first access.
+    """
+    __slots__ = ('type', 'flags', 'serial', 'fields', '_body_data', '_endian',
+                 '_body')
+
+    def __init__(self, type, fields, body=(), serial=0, flags=0):
+        self.type = type
+        self.flags = flags
+        self.serial = serial
+        self.fields = fields
+        self._body = body
+        self._body_data = None
+        self._endian = '<'
+
+    @property
+    def signature(self):
+        return self.fields.get(SIGNATURE, '')
+
+    @property
+    def body(self):
+        if self._body is None:
+            self._body = unmarshal(self.signature, self._body_data,
+                                   self._endian)
+        return self._body
+
+    @property
+    def member(self):
+        return self.fields.get(MEMBER)
+
+    @property
+    def interface(self):
+        return self.fields.get(INTERFACE)
+
+    @property
+    def path(self):
+        return self.fields.get(PATH)
+
+    @property
+    def sender(self):
+        return self.fields.get(SENDER)
+
+    @property
+    def reply_serial(self):
+        return self.fields.get(REPLY_SERIAL)
+
+    def first_uint32(self):
+        """Read the first body value, which must be a uint32, without
+        unmarshalling the rest of the body.
+        """
+        if self._body is not None:
+            return self._body[0]
+        return struct.unpack_from(self._endian + 'I', self._body_data, 0)[0]
+
+    def to_bytes(self):
+        fields = dict(self.fields)
+        body = marshal(self.signature, self._body) if self.signature \
+               else bytearray()
+        header_fields = [(code, (_header_field_types[code], value))
+                         for code, value in sorted(fields.items())]
+        buf = bytearray(struct.pack('<cBBBII', b'l', self.type, self.flags, 1,
+                                    len(body), self.serial))
+        _write_array(buf, ('(', ['y', 'v']), header_fields)
+        _pad(buf, 8)
+        buf.extend(body)
+        return buf
+
+_endians = {ord('l'): '<', ord('B'): '>'}
+
+def parse_message(buf):
+    """Try to read one message from the start of buf.
+
+    Returns (message, length), or (None, 0) if buf doesn't yet hold a whole
+    message.
+    """
+    if len(buf) < 16:
+        return None, 0
+    endian = _endians[buf[0]]
+    msg_type, flags, version, body_length, serial, fields_length = \
+        struct.unpack_from(endian + 'BBBIII', buf, 1)
+    header_end = 16 + fields_length
+    header_end += -header_end % 8
+    total = header_end + body_length
+    if len(buf) < total:
+        return None, 0
+
+    raw_fields, _ = _read_array(buf, 12, ('(', ['y', 'v']), endian)
+    msg = Message(msg_type, dict(raw_fields), None, serial, flags)
+    msg._body_data = bytes(buf[header_end:total])
+    msg._endian = endian
+    return msg, total
+
+def method_call(destination, path, interface, member, signature='', body=()):
+    fields = {PATH: path, MEMBER: member}
+    if destination:
+        fields[DESTINATION] = destination
+    if interface:
+        fields[INTERFACE] = interface
+    if signature:
+        fields[SIGNATURE] = signature
+    return Message(METHOD_CALL, fields, tuple(body))
+
+def method_return(call, signature='', body=()):
+    fields = {REPLY_SERIAL: call.serial}
+    if call.sender:
+        fields[DESTINATION] = call.sender
+    if signature:
+        fields[SIGNATURE] = signature
+    return Message(METHOD_RETURN, fields, tuple(body), flags=NO_REPLY_EXPECTED)
+
+def error_reply(call, name, message=''):
+    fields = {REPLY_SERIAL: call.serial, ERROR_NAME: name, SIGNATURE: 's'}
+    if call.sender:
+        fields[DESTINATION] = call.sender
+    return Message(ERROR, fields, (message,), flags=NO_REPLY_EXPECTED)
+
+def signal(path, interface, member, signature='', body=()):
+    fields = {PATH: path, INTERFACE: interface, MEMBER: member}
+    if signature:
+        fields[SIGNATURE] = signature
+    return Message(SIGNAL, fields, tuple(body), flags=NO_REPLY_EXPECTED)
+
+def _error_from_reply(msg):
+    text = msg.body[0] if msg.signature.startswith('s') else ''
+    return DBusError(msg.fields.get(ERROR_NAME, ''), text)
+
+# Connections ------------------------------------------------------------------
+
+def _unescape(value):
+    """Decode the %xx escapes in a D-Bus address value."""
+    parts = value.split('%')
+    res = parts[0]
+    for part in parts[1:]:
+        res += chr(int(part[:2], 16)) + part[2:]
+    return res
+
+def session_bus_addresses():
+    """Get the socket addresses to try for the session bus.
+    """
+    address = os.environ.get('DBUS_SESSION_BUS_ADDRESS')
+    if not address:
+        runtime_dir = os.environ.get('XDG_RUNTIME_DIR',
+                                     '/run/user/%d' % os.getuid())
+        return [os.path.join(runtime_dir, 'bus')]
+
+    res = []
+    for entry in address.split(';'):
+        transport, _, params = entry.partition(':')
+        if transport != 'unix':
+            continue
+        params = dict(p.split('=', 1) for p in params.split(',') if '=' in p)
+        if 'path' in params:
+            res.append(_unescape(params['path']))
+        elif 'abstract' in params:
+            res.append('\0' + _unescape(params['abstract']))
+    return res
+
+class PendingCall(object):
+    """A method call waiting for its reply, like dbus-python's PendingCall.
+    """
+    def __init__(self, conn, serial, reply_handler, error_handler):
+        self._conn = conn
+        self.serial = serial
+        self.reply_handler = reply_handler
+        self.error_handler = error_handler
+        self.reply = None
+        # Set when a dispatch thread reads the replies
+        self._done = None
+
+    def _complete(self, msg):
+        self.reply = msg
+        try:
+            if msg.type == ERROR:
+                self.error_handler(_error_from_reply(msg))
+            else:
+                self.reply_handler(*msg.body)
+        except Exception:
+            traceback.print_exc()
+        if self._done is not None:
+            self._done.set()
+
+    def block(self, timeout=DEFAULT_TIMEOUT):
+        """Wait for the reply, and call the reply or error handler.
+        
+        If there's no reply within *timeout* seconds, the error handler is
+        called with a ``NoReply`` error.
+        """
+        if not self.wait(timeout):
+            self._time_out()
+    
+    def wait(self, timeout):
+        """Wait up to *timeout* seconds for the reply, and call the reply or
+        error handler if it arrives. Returns True if it has.
+        
+        Unlike :meth:`block`, the call is still waiting for its reply if
+        this runs out of time.
+        """
+        if (self._done is not None) and \
+                (threading.current_thread() is not self._conn._dispatch_thread):
+            return self._done.wait(timeout)
+        deadline = _monotonic() + timeout
+        while self.reply is None:
+            remaining = deadline - _monotonic()
+            self._conn._read_messages(max(remaining, 0), self)
+            if (self.reply is None) and (remaining <= 0):
+                return False
+        return True
+    
+    def _time_out(self):
+        conn = self._conn
+        if self._done is None:
+            # If another thread has just read the reply, wait until it's
+            # handled.
+            with conn._recv_lock:
+                pass
+        if conn._pending.pop(self.serial, None) is self:
+            self._complete(error_reply(Message(METHOD_CALL, {}),
+                                       'org.freedesktop.DBus.Error.NoReply',
+                                       "Did not receive a reply"))
+        elif self._done is not None:
+            # The reply has just been read, and is being handled.
+            self._done.wait()
+
+    def get_complete(self):
+        return self.reply is not None
+
+class _Match(object):
+    def __init__(self, rule, handler, id_filter=None, **conditions):
+        self.rule = rule
+        self.handler = handler
+        self.id_filter = id_filter
+        self.conditions = conditions
+
+    def matches(self, msg):
+        for field, value in self.conditions.items():
+            if field == 'arg0':
+                if not (msg.signature.startswith('s') and
+                        msg.body[0] == value):
+                    return False
+            elif getattr(msg, field) != value:
+                return False
+        if self.id_filter is not None:
+            # Check the ID before unmarshalling the rest of the body.
+            if not (msg.signature.startswith('u') and
+                    self.id_filter(msg.first_uint32())):
+                return False
+        return True
+
+def match_rule(**conditions):
+    """Make a match rule string for signals."""
+    parts = ["type='signal'"]
+    for key in ('sender', 'interface', 'member', 'path', 'arg0'):
+        if conditions.get(key) is not None:
+            parts.append("%s='%s'" % (key, conditions[key]))
+    return ','.join(parts)
+
+class Connection(object):
+    """A connection to a message bus.
+
+    Messages are read from the socket whenever we wait for a reply, and when
+    :meth:`process_events` is called. Signals are queued as they arrive, and
+    :meth:`process_events` passes them to the handlers registered with
+    :meth:`add_signal_receiver`. So handlers don't run in the middle of a
+    method call, just as with a mainloop.
+
+    Incoming method calls are passed to :attr:`method_handler` in the same
+    way, if it is set; otherwise they're ignored.
+
+    Alternatively, :meth:`start_dispatch_thread` starts a thread which reads
+    all messages and dispatches signals as soon as they arrive.
+    """
+    def __init__(self, sock):
+        self._sock = sock
+        self._buf = bytearray()
+        self._serial = 0
+        self._pending = {}
+        self._matches = []
+        self._incoming = collections.deque()
+        self._send_lock = threading.Lock()
+        self._recv_lock = threading.RLock()
+        self.unique_name = None
+        self.method_handler = None
+        self._dispatch_thread = None
+        self._closed = False
+
+    @classmethod
+    def session_bus(cls):
+        """Connect and authenticate to the session bus.
+        """
+        err = None
+        for address in session_bus_addresses():
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                sock.connect(address)
+            except socket.error as e:
+                sock.close()
+                err = e
+                continue
+            conn = cls(sock)
+            conn._authenticate()
+            conn.unique_name = conn.call(BUS_NAME, BUS_PATH, BUS_INTERFACE,
+                                         'Hello')[0]
+            return conn
+        raise DBusError('org.freedesktop.DBus.Error.NoServer',
+                        "Could not connect to the session bus: %s" % err)
+
+    def _authenticate(self):
+        uid = str(os.getuid()).encode('ascii')
+        hex_uid = ''.join('%02x' % c for c in bytearray(uid)).encode('ascii')
+        self._sock.sendall(b'\0AUTH EXTERNAL ' + hex_uid + b'\r\n')
+        line = self._read_line()
+        if not line.startswith(b'OK '):
+            raise DBusError('org.freedesktop.DBus.Error.AuthFailed',
+                            line.decode('ascii', 'replace'))
+        self._sock.sendall(b'BEGIN\r\n')
+
+    def _read_line(self):
+        while b'\r\n' not in self._buf:
+            data = self._sock.recv(4096)
+            if not data:
+                raise DBusError('org.freedesktop.DBus.Error.Disconnected',
+                                "Connection closed during authentication")
+            self._buf.extend(data)
+        line, _, rest = bytes(self._buf).partition(b'\r\n')
+        self._buf = bytearray(rest)
+        return line
+
+    def close(self):
+        self._closed = True
+        thread = self._dispatch_thread
+        if thread is not None:
+            try:
+                # Wake the dispatch thread up from select()
+                self._sock.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
+            if thread is not threading.current_thread():
+                thread.join()
+        self._sock.close()
+        self._fail_pending()
+    
+    def _fail_pending(self):
+        """Pass a Disconnected error to calls waiting for replies, as
+        nothing will read their replies now.
+        """
+        error = error_reply(Message(METHOD_CALL, {}),
+                            'org.freedesktop.DBus.Error.Disconnected',
+                            "The connection was closed")
+        pending, self._pending = self._pending, {}
+        for call in pending.values():
+            call._complete(error)
+
+    def start_dispatch_thread(self):
+        """Start a thread to read messages and dispatch signals.
+
+        Threads waiting for a reply then wait for this thread to read it,
+        rather than reading from the socket themselves.
+        """
+        thread = threading.Thread(target=self._dispatch_loop,
+                                  name='notify2 dispatch')
+        thread.daemon = True
+        self._dispatch_thread = thread
+        thread.start()
+
+    def _dispatch_loop(self):
+        try:
+            while not self._closed:
+                self.process_events(None)
+        except (socket.error, ValueError, DBusError):
+            if not self._closed:
+                traceback.print_exc()
+        finally:
+            # Nothing else will read the replies to pending calls.
+            self._fail_pending()
+
+    def fileno(self):
+        return self._sock.fileno()
+
+    def send(self, msg):
+        """Send a message, assigning its serial number. Returns the serial.
+        """
+        with self._send_lock:
+            self._serial += 1
+            msg.serial = self._serial
+            self._sock.sendall(msg.to_bytes())
+        return msg.serial
+
+    def send_with_reply(self, msg, reply_handler, error_handler):
+        """Send a method call, and return a :class:`PendingCall` for the
+        reply.
+        """
+        with self._send_lock:
+            self._serial += 1
+            msg.serial = self._serial
+            pending = PendingCall(self, msg.serial, reply_handler,
+                                  error_handler)
+            if self._dispatch_thread is not None:
+                pending._done = threading.Event()
+            self._pending[msg.serial] = pending
+            self._sock.sendall(msg.to_bytes())
+        return pending
+
+    def call(self, destination, path, interface, member, signature='',
+             body=(), timeout=DEFAULT_TIMEOUT):
+        """Call a method and wait up to *timeout* seconds for the reply.
+        Returns the reply body, or raises :exc:`DBusError`.
+        """
+        result = []
+        pending = self.send_with_reply(
+            method_call(destination, path, interface, member, signature, body),
+            lambda *args: result.append(args), result.append)
+        pending.block(timeout)
+        if isinstance(result[0], Exception):
+            raise result[0]
+        return result[0]
+
+    def call_async(self, destination, path, interface, member, signature,
+                   body, reply_handler, error_handler, **kwargs):
+        """Call a method without waiting for the reply. The arguments match
+        dbus-python's ``Connection.call_async``.
+        """
+        return self.send_with_reply(
+            method_call(destination, path, interface, member, signature, body),
+            reply_handler, error_handler)
+
+    def add_signal_receiver(self, handler, id_filter=None, **conditions):
+        """Call handler(*args) for signals matching the conditions.
+
+        Conditions can be sender, interface, member, path and arg0. If
+        id_filter is given, signals whose first argument is a uint32 are only
+        passed on if id_filter(value) is true. Returns an object with a
+        ``remove()`` method to stop receiving the signals.
+        """
+        rule = match_rule(**conditions)
+        # Signals come from unique names, so the bus has to resolve
+        # well-known sender names; we can only check unique ones here.
+        local = dict((k, v) for k, v in conditions.items()
+                     if (v is not None) and
+                        ((k != 'sender') or v.startswith(':')))
+        match = _Match(rule, handler, id_filter, **local)
+        self._matches.append(match)
+        self.call(BUS_NAME, BUS_PATH, BUS_INTERFACE, 'AddMatch', 's', (rule,))
+        return _SignalMatch(self, match)
+
+    def _remove_match(self, match):
+        if match in self._matches:
+            self._matches.remove(match)
+            self.call(BUS_NAME, BUS_PATH, BUS_INTERFACE, 'RemoveMatch', 's',
+                      (match.rule,))
+
+    def process_events(self, timeout=0):
+        """Dispatch queued signals, and any messages which arrive within
+        timeout seconds (None to wait for at least one message).
+        """
+        if not self._incoming:
+            self._read_messages(timeout)
+        while self._incoming:
+            msg = self._incoming.popleft()
+            if msg.type == SIGNAL:
+                self._dispatch_signal(msg)
+            else:
+                self._dispatch_method_call(msg)
+
+    def _read_messages(self, timeout, pending=None):
+        """Read and dispatch messages, waiting up to *timeout* seconds for
+        some to arrive - unless the reply to *pending* has already been read,
+        perhaps by another thread while this one waited for the lock.
+        """
+        with self._recv_lock:
+            if (pending is not None) and (pending.reply is not None):
+                return
+            if self._closed:
+                raise DBusError('org.freedesktop.DBus.Error.Disconnected',
+                                "The connection was closed")
+            if self._buf_has_message():
+                self._dispatch_buffered()
+                return
+            ready = select.select([self._sock], [], [], timeout)[0]
+            if not ready:
+                return
+            data = self._sock.recv(65536)
+            if not data:
+                raise DBusError('org.freedesktop.DBus.Error.Disconnected',
+                                "The bus closed the connection")
+            self._buf.extend(data)
+            self._dispatch_buffered()
+
+    def _buf_has_message(self):
+        return parse_message(self._buf)[0] is not None
+
+    def _dispatch_buffered(self):
+        while True:
+            msg, length = parse_message(self._buf)
+            if msg is None:
+                return
+            del self._buf[:length]
+            self.dispatch(msg)
+
+    def dispatch(self, msg):
+        if msg.type in (METHOD_RETURN, ERROR):
+            pending = self._pending.pop(msg.reply_serial, None)
+            if pending is not None:
+                pending._complete(msg)
+        elif msg.type == SIGNAL or (msg.type == METHOD_CALL and
+                                    self.method_handler is not None):
+            self._incoming.append(msg)
+
+    def _dispatch_signal(self, msg):
+        for match in list(self._matches):
+            if match.matches(msg):
+                try:
+                    match.handler(*msg.body)
+                except Exception:
+                    # Like dbus-python, don't let errors in callbacks break
+                    # receiving messages.
+                    traceback.print_exc()
+
+    def _dispatch_method_call(self, msg):
+        try:
+            self.method_handler(msg)
+        except Exception as e:
+            traceback.print_exc()
+            if not msg.flags & NO_REPLY_EXPECTED:
+                self.send(error_reply(msg, 'org.freedesktop.DBus.Error.Failed',
+                                      str(e)))
+
+class _SignalMatch(object):
+    def __init__(self, conn, match):
+        self._conn = conn
+        self._match = match
+
+    def remove(self):
+        self._conn._remove_match(self._match)
+
+    cancel = remove
@@ -0,0 +1,363 @@
+"""asyncio interface to notify2.
+
+This provides coroutine versions of the notify2 functions which talk to the
+notification server, so asyncio programs don't have to push them into an
+executor::
+
+    import notify2, notify2.aio
+
+    await notify2.aio.init('app name')
+    n = notify2.Notification("Summary", "Some body text")
+    await notify2.aio.show(n)
+
+It talks to D-Bus using `jeepney <https://pypi.org/project/jeepney/>`_ rather
+than dbus-python. Callbacks from notifications (see
+:meth:`~notify2.Notification.add_action` and
+:meth:`~notify2.Notification.connect`) are dispatched from the asyncio event
+loop, so you don't need a GLib or Qt mainloop to receive them.
+
+Like :class:`notify2.NotificationClient`, an :class:`AsyncNotificationClient`
+has its own connection, app name and callbacks, separate from the
+module-level functions in both modules.
+"""
+
+import asyncio
+import traceback
+
+import notify2
+from notify2 import _SERVICE, _PATH, _INTERFACE
+
+initted = False
+
+def _signal_rule():
+    from jeepney import MatchRule
+    return MatchRule(type='signal', sender=_SERVICE, interface=_INTERFACE,
+                     path=_PATH)
+
+class AsyncNotificationClient(object):
+    """A connection to the notification server for asyncio programs, with its
+    own app name, callbacks and cached server information. This is the
+    asyncio counterpart of :class:`notify2.NotificationClient`.
+    
+    The module-level coroutines, such as :func:`init` and :func:`show`, use a
+    default client. Notifications whose *client* is one of these are shown
+    with it by :func:`show`::
+    
+        client = notify2.aio.AsyncNotificationClient()
+        await client.init("Tenant A")
+        n = notify2.Notification("Summary", client=client)
+        await notify2.aio.show(n)
+    
+    registry : NotificationRegistry
+      Where to track this client's notifications for callbacks. By default,
+      each client has a new one.
+    """
+    def __init__(self, registry=None):
+        self.initted = False
+        self.app_name = ""
+        # Tracks notifications for callbacks, holds signals which arrive
+        # before the reply with their ID, and caches the server information.
+        # It doesn't connect itself; this client receives signals for it.
+        self._client = notify2.NotificationClient(registry=registry)
+        self._client._have_mainloop = True
+        import threading
+        self._client._early_lock = threading.Lock()
+        self._router = None
+        self._signal_filter = None
+        self._owner_filter = None
+        self._signal_task = None
+        # Signals about notifications are only subscribed to while
+        # notifications need callbacks, as in notify2 itself.
+        self._subscription = None   # Task adding the match rule, once started
+        # The server's unique name, to check signals' sender
+        self._server_owner = None
+    
+    @property
+    def registry(self):
+        """The :class:`~notify2.NotificationRegistry` tracking this client's
+        notifications for callbacks.
+        """
+        return self._client.registry
+    
+    def _get_router(self):
+        if self._router is None:
+            raise notify2.UninittedError("You must call init() before using "
+                                         "the notification features.")
+        return self._router
+    
+    async def _call(self, method, signature=None, body=()):
+        from jeepney import DBusAddress, new_method_call
+        from jeepney.wrappers import unwrap_msg
+        
+        addr = DBusAddress(_PATH, bus_name=_SERVICE, interface=_INTERFACE)
+        msg = new_method_call(addr, method, signature, body)
+        reply = await self._get_router().send_and_get_reply(msg)
+        return unwrap_msg(reply)
+    
+    async def init(self, app_name):
+        """Connect to the session bus. See :func:`init`.
+        
+        If this client is already connected, it closes that connection first.
+        """
+        from jeepney import MatchRule, message_bus
+        from jeepney.io.asyncio import open_dbus_connection, DBusRouter, Proxy
+        
+        await self.uninit()
+        conn = await open_dbus_connection(bus='SESSION')
+        router = DBusRouter(conn)
+        
+        # The bus resolves the well-known name in the match rule (added once
+        # notifications need signals), but the signals we receive come from
+        # the server's unique name, so the rule for our local filter can't
+        # include the sender; _dispatch_signals() checks it.
+        rule = MatchRule(type='signal', interface=_INTERFACE, path=_PATH)
+        # Forget cached server capabilities when the server changes.
+        owner_rule = MatchRule(type='signal', sender=message_bus.bus_name,
+                               interface=message_bus.interface,
+                               member='NameOwnerChanged')
+        owner_rule.add_arg_condition(0, _SERVICE)
+        try:
+            await Proxy(message_bus, router).AddMatch(owner_rule)
+        except BaseException:
+            await router.__aexit__(None, None, None)
+            await conn.close()
+            raise
+        
+        queue = asyncio.Queue()
+        self._signal_filter = router.filter(rule, queue=queue)
+        self._owner_filter = router.filter(owner_rule, queue=queue)
+        self._signal_task = asyncio.ensure_future(
+            self._dispatch_signals(queue))
+        
+        self._router = router
+        self.app_name = app_name
+        self._client.invalidate_server_cache()
+        self.initted = True
+        return True
+    
+    async def uninit(self):
+        """Undo what :meth:`init` does, closing the connection.
+        """
+        if self._router is None:
+            return
+        
+        self._signal_task.cancel()
+        self._signal_filter.close()
+        self._owner_filter.close()
+        router, self._router = self._router, None
+        await router.__aexit__(None, None, None)
+        await router._conn.close()
+        self._signal_filter = self._signal_task = self._owner_filter = None
+        self._subscription = self._server_owner = None
+        self._client._showing = 0
+        self._client._early_signals.clear()
+        self._client.invalidate_server_cache()
+        self.initted = False
+    
+    # Server information
+    
+    async def get_server_caps(self):
+        """Get a list of server capabilities. See :func:`get_server_caps`.
+        """
+        caps = self._client._server_caps
+        if caps is None:
+            caps = self._client._load_server_caps(
+                (await self._call('GetCapabilities'))[0])
+        return list(caps)
+    
+    async def get_server_caps_set(self):
+        """Get server capabilities as a frozenset. See
+        :func:`get_server_caps_set`.
+        """
+        if self._client._server_caps is None:
+            self._client._load_server_caps(
+                (await self._call('GetCapabilities'))[0])
+        return self._client._server_caps_set
+    
+    async def get_server_info(self):
+        """Get basic information about the server. See
+        :func:`get_server_info`.
+        """
+        info = self._client._server_info
+        if info is None:
+            info = self._client._load_server_info(
+                await self._call('GetServerInformation'))
+        return dict(info)
+    
+    def invalidate_server_cache(self):
+        """Forget the cached server capabilities and information. See
+        :func:`notify2.invalidate_server_cache`.
+        """
+        self._client.invalidate_server_cache()
+    
+    # Signals and callbacks
+    
+    def set_callback_executor(self, executor):
+        """Run callbacks from this client's notifications with *executor*.
+        See :func:`notify2.set_callback_executor`.
+        """
+        self._client.set_callback_executor(executor)
+    
+    async def _subscribe(self):
+        from jeepney import message_bus
+        from jeepney.io.asyncio import Proxy
+        from jeepney.wrappers import DBusErrorResponse
+        
+        proxy = Proxy(message_bus, self._get_router())
+        await proxy.AddMatch(_signal_rule())
+        try:
+            self._server_owner, = await proxy.GetNameOwner(_SERVICE)
+        except DBusErrorResponse:
+            pass   # Not running yet; NameOwnerChanged says when it starts
+    
+    async def _listen(self, n):
+        """Subscribe to signals from the server if notification *n* needs
+        them, before it's sent, so none are missed.
+        
+        Returns True if it does; call _done_showing() once it's been shown.
+        """
+        if not n._wants_signals():
+            return False
+        self._client._showing += 1
+        if self._subscription is None:
+            self._subscription = asyncio.ensure_future(self._subscribe())
+        try:
+            await self._subscription
+        except BaseException:
+            await self._done_showing()
+            raise
+        return True
+    
+    async def _done_showing(self):
+        self._client._done_showing()
+        await self._unsubscribe_if_idle()
+    
+    async def _unsubscribe_if_idle(self):
+        if (self._subscription is not None) and (self._client._showing == 0) \
+                and (len(self.registry) == 0):
+            subscription, self._subscription = self._subscription, None
+            from jeepney import message_bus
+            from jeepney.io.asyncio import Proxy
+            if subscription.done() and subscription.exception() is None:
+                await Proxy(message_bus, self._get_router()).RemoveMatch(
+                    _signal_rule())
+    
+    async def _dispatch_signals(self, queue):
+        from jeepney import HeaderFields
+        
+        while True:
+            msg = await queue.get()
+            fields = msg.header.fields
+            member = fields.get(HeaderFields.member)
+            if (member != 'NameOwnerChanged') and \
+                    (fields.get(HeaderFields.sender) != self._server_owner):
+                # Only the server itself is listened to, not anything else
+                # claiming its interface.
+                continue
+            try:
+                if member == 'ActionInvoked':
+                    self._client._action_callback(*msg.body)
+                elif member == 'NotificationClosed':
+                    self._client._closed_callback(*msg.body)
+                    await self._unsubscribe_if_idle()
+                elif member == 'NameOwnerChanged':
+                    self._server_owner = msg.body[2] or None
+                    self._client.invalidate_server_cache()
+            except Exception:
+                # Like dbus-python, don't let errors in callbacks stop later
+                # signals being dispatched.
+                traceback.print_exc()
+    
+    # Showing and closing notifications
+    
+    async def show(self, n):
+        """Ask the server to show the :class:`~notify2.Notification` *n*,
+        and return its ID once the server has replied. See :func:`show`.
+        """
+        app_name, replaces_id, icon, summary, message, actions, hints, \
+            timeout = n._make_notify_args(self.app_name)
+        hints = notify2._hint_variants(hints)
+        listening = await self._listen(n)
+        try:
+            nid, = await self._call('Notify', 'susssasa{sv}i',
+                                    (app_name, replaces_id, icon, summary,
+                                     message, actions, hints, timeout))
+            self._client._shown(n, nid)
+        finally:
+            if listening:
+                await self._done_showing()
+        return n.id
+    
+    async def close(self, n):
+        """Ask the server to close the :class:`~notify2.Notification` *n*.
+        """
+        if n.id != 0:
+            await self._call('CloseNotification', 'u', (n.id,))
+
+# The client used by the module-level functions, and by notifications which
+# aren't given one.
+_client = AsyncNotificationClient()
+
+def _client_for(n):
+    if isinstance(n.client, AsyncNotificationClient):
+        return n.client
+    return _client
+
+async def init(app_name):
+    """Connect to the session bus. This is the asyncio counterpart of
+    :func:`notify2.init`, and must be awaited before using the other
+    functions in this module.
+
+    Signals from the notification server are dispatched in a task on the
+    running event loop. Calling this again closes the previous connection.
+    """
+    global initted
+    try:
+        return await _client.init(app_name)
+    finally:
+        initted = _client.initted
+
+async def uninit():
+    """Undo what :func:`init` does, closing the connection.
+    """
+    global initted
+    await _client.uninit()
+    initted = False
+
+async def get_server_caps():
+    """Get a list of server capabilities. See :func:`notify2.get_server_caps`.
+    """
+    return await _client.get_server_caps()
+
+async def get_server_caps_set():
+    """Get server capabilities as a frozenset. See
+    :func:`notify2.get_server_caps_set`.
+    """
+    return await _client.get_server_caps_set()
+
+async def get_server_info():
+    """Get basic information about the server. See
+    :func:`notify2.get_server_info`.
+    """
+    return await _client.get_server_info()
+
+async def show(n):
+    """Ask the server to show the :class:`~notify2.Notification` *n*, and
+    return its ID once the server has replied. See
+    :meth:`notify2.Notification.show`.
+    
+    If *n* was made with an :class:`AsyncNotificationClient`, it's shown with
+    that; otherwise with the one set up by :func:`init`.
+    """
+    return await _client_for(n).show(n)
+
+async def show_many(notifications):
+    """Show several notifications, sending all of the requests before waiting
+    for any of the replies. See :func:`notify2.show_many`.
+    """
+    return list(await asyncio.gather(*[show(n) for n in notifications]))
+
+async def close(n):
+    """Ask the server to close the :class:`~notify2.Notification` *n*.
+    """
+    await _client_for(n).close(n)
@@ -0,0 +1,228 @@
+"""A stand-in notification server, for tests and benchmarks.
+
+This implements ``org.freedesktop.Notifications`` on a D-Bus session bus,
+without displaying anything. It records the calls made to it, can send the
+``ActionInvoked`` and ``NotificationClosed`` signals on demand, and can add
+artificial latency to each reply, so the whole path from
+:meth:`notify2.Notification.show` to callbacks can be tested and measured on
+machines without a desktop::
+
+    from notify2.fake_server import PrivateBus, FakeNotificationServer
+
+    with PrivateBus(), FakeNotificationServer(latency=0.001) as server:
+        notify2.init('test', backend='socket')
+        n = notify2.Notification("Summary")
+        n.show()
+        server.invoke_action(n.id, 'default')
+        notify2.process_events(1)
+
+:class:`PrivateBus` needs the ``dbus-daemon`` program. It can also be run from
+the command line, serving on the current session bus, or on a private bus with
+``--private``::
+
+    python -m notify2.fake_server --private --latency 0.005
+"""
+
+from __future__ import print_function
+
+import os
+import subprocess
+import sys
+import threading
+import time
+
+from notify2 import _SERVICE, _PATH, _INTERFACE, _wire
+
+_REASON_CLOSED_BY_CALL = 3
+
+class PrivateBus(object):
+    """Run a private ``dbus-daemon`` session bus.
+
+    While it's running, ``DBUS_SESSION_BUS_ADDRESS`` points to it, so
+    connections to the session bus in this process (and child processes)
+    go to the private bus. Use it as a context manager, or call
+    :meth:`start` and :meth:`stop`.
+    """
+    def __init__(self):
+        self.address = None
+        self._proc = None
+        self._old_address = None
+
+    def start(self):
+        self._proc = subprocess.Popen(
+            ['dbus-daemon', '--session', '--nofork', '--print-address=1'],
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        self.address = self._proc.stdout.readline().decode('ascii').strip()
+        if not self.address:
+            self._proc.wait()
+            raise RuntimeError("dbus-daemon failed to start")
+        self._old_address = os.environ.get('DBUS_SESSION_BUS_ADDRESS')
+        os.environ['DBUS_SESSION_BUS_ADDRESS'] = self.address
+        return self
+
+    def stop(self):
+        if self._proc is None:
+            return
+        if self._old_address is None:
+            os.environ.pop('DBUS_SESSION_BUS_ADDRESS', None)
+        else:
+            os.environ['DBUS_SESSION_BUS_ADDRESS'] = self._old_address
+        self._proc.terminate()
+        self._proc.wait()
+        self._proc.stdout.close()
+        self._proc = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+class FakeNotificationServer(object):
+    """Serve ``org.freedesktop.Notifications`` on the session bus, from a
+    background thread.
+
+    Each reply is delayed by *latency* seconds. Requests are handled one at a
+    time, as a real server would.
+    """
+    def __init__(self, latency=0.0,
+                 capabilities=('actions', 'body', 'body-markup',
+                               'icon-static', 'persistence'),
+                 server_info=('notify2 fake server', 'notify2', '1.0', '1.2')):
+        self.latency = latency
+        self.capabilities = list(capabilities)
+        self.server_info = tuple(server_info)
+        #: A list of (method name, arguments) tuples for the calls received.
+        self.calls = []
+        #: A dict mapping IDs to Notify arguments for open notifications.
+        self.notifications = {}
+        self._last_id = 0
+        self._lock = threading.Lock()
+        self._conn = None
+        self._thread = None
+        self._stopping = False
+
+    def start(self):
+        """Connect to the session bus, claim the notifications name, and
+        start handling calls.
+        """
+        self._conn = conn = _wire.Connection.session_bus()
+        conn.method_handler = self._handle
+        # Flags: replace any existing owner, and don't queue for the name.
+        res = conn.call(_wire.BUS_NAME, _wire.BUS_PATH, _wire.BUS_INTERFACE,
+                        'RequestName', 'su', (_SERVICE, 0x2 | 0x4))[0]
+        if res != 1:   # DBUS_REQUEST_NAME_REPLY_PRIMARY_OWNER
+            conn.close()
+            raise RuntimeError("Couldn't get the name %s" % _SERVICE)
+        self._stopping = False
+        self._thread = threading.Thread(target=self._serve,
+                                        name='notify2 fake server')
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop serving, and disconnect."""
+        if self._thread is None:
+            return
+        self._stopping = True
+        self._thread.join()
+        self._conn.close()
+        self._thread = self._conn = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _serve(self):
+        try:
+            while not self._stopping:
+                self._conn.process_events(0.05)
+        except _wire.DBusError:
+            pass   # The bus has gone away
+
+    def _handle(self, msg):
+        if msg.interface not in (_INTERFACE, None) or msg.path != _PATH:
+            self._conn.send(_wire.error_reply(
+                msg, 'org.freedesktop.DBus.Error.UnknownObject', msg.path))
+            return
+        handler = getattr(self, '_handle_' + msg.member, None)
+        if handler is None:
+            self._conn.send(_wire.error_reply(
+                msg, 'org.freedesktop.DBus.Error.UnknownMethod', msg.member))
+            return
+
+        body = msg.body
+        with self._lock:
+            self.calls.append((msg.member, body))
+        if self.latency:
+            time.sleep(self.latency)
+        self._conn.send(_wire.method_return(msg, *handler(*body)))
+
+    def _handle_Notify(self, app_name, replaces_id, app_icon, summary, body,
+                       actions, hints, expire_timeout):
+        with self._lock:
+            nid = replaces_id
+            if nid not in self.notifications:
+                self._last_id += 1
+                nid = self._last_id
+            self.notifications[nid] = (app_name, nid, app_icon, summary, body,
+                                       actions, hints, expire_timeout)
+        return 'u', (nid,)
+
+    def _handle_CloseNotification(self, nid):
+        self.close_notification(nid, _REASON_CLOSED_BY_CALL)
+        return '', ()
+
+    def _handle_GetCapabilities(self):
+        return 'as', (self.capabilities,)
+
+    def _handle_GetServerInformation(self):
+        return 'ssss', self.server_info
+
+    def _emit(self, member, signature, body):
+        self._conn.send(_wire.signal(_PATH, _INTERFACE, member, signature,
+                                     body))
+
+    def invoke_action(self, nid, action_key):
+        """Send ActionInvoked, as if the user clicked an action."""
+        self._emit('ActionInvoked', 'us', (nid, action_key))
+
+    def close_notification(self, nid, reason=2):
+        """Close notification *nid*, sending NotificationClosed. The default
+        reason is that the user dismissed it.
+        """
+        with self._lock:
+            if self.notifications.pop(nid, None) is None:
+                return
+        self._emit('NotificationClosed', 'uu', (nid, reason))
+
+def main(argv=None):
+    import argparse
+    ap = argparse.ArgumentParser(prog='python -m notify2.fake_server',
+                                 description=__doc__.splitlines()[0])
+    ap.add_argument('--latency', type=float, default=0.0,
+                    help="Seconds to wait before each reply")
+    ap.add_argument('--private', action='store_true',
+                    help="Start a private dbus-daemon and print its address")
+    args = ap.parse_args(argv)
+
+    bus = PrivateBus().start() if args.private else None
+    try:
+        if bus is not None:
+            print("DBUS_SESSION_BUS_ADDRESS=%s" % bus.address)
+            sys.stdout.flush()
+        with FakeNotificationServer(latency=args.latency) as server:
+            try:
+                while True:
+                    time.sleep(1)
+            except KeyboardInterrupt:
+                print("Received %d calls" % len(server.calls))
+    finally:
+        if bus is not None:
+            bus.stop()
+
+if __name__ == '__main__':
+    main()
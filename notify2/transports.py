@@ -0,0 +1,595 @@
+"""Ways for notify2 to talk to the notification server.
+
+Everything notify2 sends to the server, and the signals it gets back, go
+through a :class:`Transport`. Pass the name of one of the transports below,
+or a :class:`Transport` instance, as the *backend* parameter of
+:func:`notify2.init`:
+
+- ``'dbus-python'``: :class:`DBusPythonTransport`
+- ``'socket'``: :class:`SocketTransport`
+- ``'stub'``: :class:`StubTransport`
+
+:class:`PooledTransport` spreads notifications over several connections.
+
+Using the same program with different transports is an easy way to compare
+them.
+"""
+
+from notify2 import _SERVICE, _PATH, _INTERFACE, _hint_variants
+
+_NOTIFY_SIGNATURE = 'susssasa{sv}i'
+
+# D-Bus errors meaning the server or the bus can't be reached at the moment.
+_LOST_ERRORS = frozenset('org.freedesktop.DBus.Error.' + name for name in
+                         ('Disconnected', 'NoServer', 'ServiceUnknown',
+                          'NameHasNoOwner', 'NoReply'))
+
+def connection_lost(exc):
+    """Does the error *exc*, raised by a transport, mean that the connection
+    to the bus or the notification server has been lost?
+    
+    Errors from the server about a particular call, such as bad arguments,
+    don't.
+    """
+    if isinstance(exc, EnvironmentError):
+        return True
+    get_dbus_name = getattr(exc, 'get_dbus_name', None)
+    return (get_dbus_name is not None) and (get_dbus_name() in _LOST_ERRORS)
+
+class Transport(object):
+    """Base class for transports.
+
+    Subclasses connect when they're created, and implement the methods below.
+    The arguments to :meth:`notify` and :meth:`notify_async` are the eight
+    arguments of the ``Notify`` method in the spec, as a tuple.
+    """
+    #: The name to pass to :func:`notify2.init` for this transport.
+    name = None
+
+    #: The values other than None this transport accepts for the *mainloop*
+    #: parameter of :func:`notify2.init`.
+    mainloops = ()
+
+    @classmethod
+    def check_mainloop(cls, mainloop):
+        """Raise ValueError if this transport can't use *mainloop*."""
+        if (mainloop is not None) and (mainloop not in cls.mainloops):
+            raise ValueError("The %s backend can't use the mainloop %r"
+                             % (cls.name, mainloop))
+
+    #: True if the transport can deliver signals, e.g. dbus-python with a
+    #: mainloop.
+    receives_signals = False
+
+    def watch_server(self, server_changed):
+        """Call ``server_changed(new_owner)`` when the server starts, stops
+        or is replaced. notify2 calls this when it connects, if
+        :attr:`receives_signals` is True.
+        """
+        pass
+
+    def subscribe(self, action_invoked, notification_closed, is_tracked=None):
+        """Start passing signals about notifications to the callbacks:
+
+        - ``action_invoked(nid, action_key)``
+        - ``notification_closed(nid, reason)``
+
+        notify2 only calls this once a notification needs callbacks. The
+        signals should only come from the current server. If the transport
+        can check the notification ID before decoding the rest of a signal,
+        it can use ``is_tracked(nid)`` to ignore notifications notify2
+        doesn't need to hear about, such as those from other programs.
+        """
+        pass
+
+    def unsubscribe(self):
+        """Stop passing on the signals set up by :meth:`subscribe`. notify2
+        calls this when no notifications need callbacks.
+        """
+        pass
+
+    def notify(self, args):
+        """Show a notification, and return its ID."""
+        raise NotImplementedError
+
+    def notify_async(self, args, reply_handler, error_handler):
+        """Show a notification without waiting for the reply.
+
+        ``reply_handler(nid)`` or ``error_handler(exc)`` is called when the
+        reply arrives. Returns an object with a ``block()`` method, which
+        waits for the reply.
+        """
+        raise NotImplementedError
+
+    def close_notification(self, nid):
+        raise NotImplementedError
+
+    def get_capabilities(self):
+        """Return a list of capability strings."""
+        raise NotImplementedError
+
+    def get_server_information(self):
+        """Return (name, vendor, version, spec_version)."""
+        raise NotImplementedError
+
+    def process_events(self, timeout=0):
+        """Dispatch signals which have arrived, waiting up to *timeout*
+        seconds for them. Only transports without a mainloop need this.
+        """
+        raise RuntimeError("process_events() isn't needed with the %s backend"
+                           % self.name)
+
+    def close(self):
+        """Stop receiving signals and disconnect."""
+        pass
+
+class DBusPythonTransport(Transport):
+    """Talk to the server using dbus-python.
+
+    *mainloop* is as for :func:`notify2.init`. Signals are only delivered if
+    there is a mainloop. If *private* is True, this makes a new connection to
+    the bus, rather than using dbus-python's shared one.
+    """
+    name = 'dbus-python'
+    mainloops = ('glib', 'qt')
+
+    @classmethod
+    def check_mainloop(cls, mainloop):
+        # Mainloop objects from dbus-python are also accepted.
+        if isinstance(mainloop, str):
+            super(DBusPythonTransport, cls).check_mainloop(mainloop)
+
+    def __init__(self, mainloop=None, private=False):
+        import dbus
+
+        if mainloop == 'glib':
+            from dbus.mainloop.glib import DBusGMainLoop
+            mainloop = DBusGMainLoop()
+        elif mainloop == 'qt':
+            from dbus.mainloop.qt import DBusQtMainLoop
+            # For some reason, this only works if we make it the default
+            # mainloop for dbus. That might make life tricky for anyone trying
+            # to juggle two event loops, but I can't see any way round it.
+            mainloop = DBusQtMainLoop(set_as_default=True)
+
+        self.private = private
+        self.bus = dbus.SessionBus(mainloop=mainloop, private=private)
+        self.has_mainloop = bool(mainloop or dbus.get_default_main_loop())
+        # Otherwise, the proxy is bound to the server's unique name when it's
+        # made, and calls and signals would still go to a server which has
+        # been replaced. Following the owner needs a mainloop; without one,
+        # init(reconnect=True) makes a new connection instead.
+        dbus_obj = self.bus.get_object(
+            _SERVICE, _PATH, follow_name_owner_changes=self.has_mainloop)
+        self.interface = dbus.Interface(dbus_obj, dbus_interface=_INTERFACE)
+        self._matches = []
+        self._signal_matches = []
+
+    @property
+    def receives_signals(self):
+        return self.has_mainloop
+
+    def watch_server(self, server_changed):
+        self._matches.append(self.bus.watch_name_owner(_SERVICE,
+                                                       server_changed))
+
+    def subscribe(self, action_invoked, notification_closed, is_tracked=None):
+        # The proxy follows the owner of the well-known name, and
+        # dbus-python only passes on signals from the current owner.
+        self._signal_matches = [
+            self.interface.connect_to_signal('ActionInvoked', action_invoked),
+            self.interface.connect_to_signal('NotificationClosed',
+                                             notification_closed),
+        ]
+
+    def unsubscribe(self):
+        for match in self._signal_matches:
+            match.remove()
+        self._signal_matches = []
+
+    def _dbus_args(self, args):
+        # Hint values are stored as plain Python values; dbus-python needs
+        # to be told the types of some, such as bytes and icon structs.
+        # Hints shared with a NotificationTemplate are only converted once.
+        from notify2 import _dbus_hints
+        return args[:6] + (_dbus_hints(args[6]),) + args[7:]
+    
+    def notify(self, args):
+        return self.interface.Notify(*self._dbus_args(args))
+    
+    def notify_async(self, args, reply_handler, error_handler):
+        return self.bus.call_async(_SERVICE, _PATH, _INTERFACE, 'Notify',
+                                   _NOTIFY_SIGNATURE, self._dbus_args(args),
+                                   reply_handler, error_handler,
+                                   require_main_loop=False)
+
+    def close_notification(self, nid):
+        self.interface.CloseNotification(nid)
+
+    def get_capabilities(self):
+        return self.interface.GetCapabilities()
+
+    def get_server_information(self):
+        return self.interface.GetServerInformation()
+
+    def close(self):
+        self.unsubscribe()
+        for match in self._matches:
+            match.remove()
+        self._matches = []
+        if self.private:
+            self.bus.close()
+
+class SocketTransport(Transport):
+    """Speak the D-Bus protocol directly over the session bus socket, so
+    dbus-python isn't needed.
+
+    By default, signals are queued as they arrive, and dispatched when you
+    call :func:`notify2.process_events`. If *mainloop* is ``'thread'``, a
+    background thread receives signals and dispatches them immediately,
+    so callbacks work without GLib or Qt. Callbacks are then called in that
+    thread.
+    """
+    name = 'socket'
+    mainloops = ('thread',)
+
+    def __init__(self, mainloop=None):
+        from notify2 import _wire
+        self.check_mainloop(mainloop)
+        self._wire = _wire
+        self.mainloop = mainloop
+        self.conn = _wire.Connection.session_bus()
+        self._handlers = None
+        self._is_tracked = None
+        self._signal_matches = []
+
+    def _call(self, member, signature='', body=()):
+        return self.conn.call(_SERVICE, _PATH, _INTERFACE, member, signature,
+                              body)
+
+    def _notify_body(self, args):
+        return args[:5] + (list(args[5]), _hint_variants(args[6]), args[7])
+
+    receives_signals = True
+
+    def watch_server(self, server_changed):
+        wire = self._wire
+
+        def owner_changed(name, old_owner, new_owner):
+            self._match_owner(new_owner)
+            server_changed(new_owner)
+
+        self.conn.add_signal_receiver(owner_changed, sender=wire.BUS_NAME,
+                                      interface=wire.BUS_INTERFACE,
+                                      path=wire.BUS_PATH,
+                                      member='NameOwnerChanged', arg0=_SERVICE)
+        if self.mainloop == 'thread':
+            self.conn.start_dispatch_thread()
+
+    def subscribe(self, action_invoked, notification_closed, is_tracked=None):
+        wire = self._wire
+        self._handlers = [('ActionInvoked', action_invoked),
+                          ('NotificationClosed', notification_closed)]
+        self._is_tracked = is_tracked
+        try:
+            owner = self.conn.call(wire.BUS_NAME, wire.BUS_PATH,
+                                   wire.BUS_INTERFACE, 'GetNameOwner', 's',
+                                   (_SERVICE,))[0]
+        except wire.DBusError:
+            owner = ''   # Not running yet; D-Bus will start it when needed
+        self._match_owner(owner)
+
+    def _match_owner(self, owner):
+        """Only receive notification signals from the server's unique name,
+        rather than from anything claiming its interface.
+        """
+        if not self._handlers:
+            return
+        for match in self._signal_matches:
+            match.remove()
+        # Without an owner, match the well-known name until the server starts
+        sender = owner or _SERVICE
+        self._signal_matches = [
+            self.conn.add_signal_receiver(handler, id_filter=self._is_tracked,
+                                          sender=sender, interface=_INTERFACE,
+                                          path=_PATH, member=member)
+            for member, handler in self._handlers
+        ]
+
+    def unsubscribe(self):
+        self._handlers = None
+        for match in self._signal_matches:
+            match.remove()
+        self._signal_matches = []
+
+    def notify(self, args):
+        return self._call('Notify', _NOTIFY_SIGNATURE,
+                          self._notify_body(args))[0]
+
+    def notify_async(self, args, reply_handler, error_handler):
+        return self.conn.call_async(_SERVICE, _PATH, _INTERFACE, 'Notify',
+                                    _NOTIFY_SIGNATURE, self._notify_body(args),
+                                    reply_handler, error_handler)
+
+    def close_notification(self, nid):
+        self._call('CloseNotification', 'u', (nid,))
+
+    def get_capabilities(self):
+        return self._call('GetCapabilities')[0]
+
+    def get_server_information(self):
+        return self._call('GetServerInformation')
+
+    def process_events(self, timeout=0):
+        if self.mainloop == 'thread':
+            raise RuntimeError("Signals are dispatched by a background thread")
+        self.conn.process_events(timeout)
+
+    def close(self):
+        self.conn.close()
+
+class PooledTransport(Transport):
+    """Spread notifications over several connections to the bus.
+
+    *transports* are the connections to use, such as several
+    :class:`SocketTransport` instances. :meth:`connect` makes them, as does
+    the *connections* parameter of :func:`notify2.init`.
+
+    Each new notification is sent over the connection with the fewest calls
+    in progress, so calls from several threads (see *threaded* in
+    :func:`notify2.init`), or from :meth:`~notify2.Notification.show_async`,
+    don't queue up behind each other, e.g. while one sends a large icon.
+    Replacing or closing a notification goes over the connection it was shown
+    on, so those calls reach the server in order. Signals are received on the
+    first connection.
+    """
+    #: How many notification IDs to remember the connections for. Older ones
+    #: are replaced or closed over the first connection.
+    max_routes = 1024
+
+    def __init__(self, transports):
+        import threading
+        from notify2 import ActionsDictClass
+        self.transports = list(transports)
+        if not self.transports:
+            raise ValueError("A pool needs at least one transport")
+        first = self.transports[0]
+        self.name = first.name
+        if hasattr(first, 'interface'):
+            self.interface = first.interface
+        self._lock = threading.Lock()
+        self._busy = [0] * len(self.transports)   # Calls in progress
+        self._next = 0
+        self._routes = ActionsDictClass()   # nid -> index of the transport
+
+    @classmethod
+    def connect(cls, backend, size, mainloop=None):
+        """Make a pool of *size* new connections, using the transport named
+        *backend*.
+        """
+        factory = backends[backend]
+        kwargs = {}
+        if mainloop is not None:
+            kwargs['mainloop'] = mainloop
+        if factory is DBusPythonTransport:
+            kwargs['private'] = True
+        return cls([factory(**kwargs) for i in range(size)])
+
+    @property
+    def receives_signals(self):
+        return self.transports[0].receives_signals
+
+    def _pick(self, nid):
+        """Choose the transport for a call about notification *nid* (0 for a
+        new one), and count the call as in progress.
+        """
+        with self._lock:
+            i = self._routes.get(nid) if nid else None
+            if i is None:
+                # The least busy, checking them in turn from after the last
+                # one picked, so they're all used when none are busy.
+                count = len(self._busy)
+                i = min(range(self._next, self._next + count),
+                        key=lambda j: self._busy[j % count]) % count
+                self._next = (i + 1) % count
+            self._busy[i] += 1
+        return i
+
+    def _done(self, i, nid=None):
+        with self._lock:
+            self._busy[i] -= 1
+            if nid is not None:
+                routes = self._routes
+                routes.pop(nid, None)
+                routes[nid] = i
+                while len(routes) > self.max_routes:
+                    del routes[next(iter(routes))]
+
+    def watch_server(self, server_changed):
+        self.transports[0].watch_server(server_changed)
+
+    def subscribe(self, action_invoked, notification_closed, is_tracked=None):
+        def closed(nid, reason):
+            with self._lock:
+                self._routes.pop(int(nid), None)
+            notification_closed(nid, reason)
+
+        self.transports[0].subscribe(action_invoked, closed, is_tracked)
+
+    def unsubscribe(self):
+        self.transports[0].unsubscribe()
+
+    def notify(self, args):
+        i = self._pick(args[1])
+        nid = None
+        try:
+            nid = self.transports[i].notify(args)
+        finally:
+            self._done(i, None if nid is None else int(nid))
+        return nid
+
+    def notify_async(self, args, reply_handler, error_handler):
+        i = self._pick(args[1])
+
+        def on_reply(nid):
+            self._done(i, int(nid))
+            reply_handler(nid)
+
+        def on_error(e):
+            self._done(i)
+            error_handler(e)
+
+        return self.transports[i].notify_async(args, on_reply, on_error)
+
+    def close_notification(self, nid):
+        with self._lock:
+            i = self._routes.pop(nid, 0)
+        self.transports[i].close_notification(nid)
+
+    def get_capabilities(self):
+        return self.transports[0].get_capabilities()
+
+    def get_server_information(self):
+        return self.transports[0].get_server_information()
+
+    def process_events(self, timeout=0):
+        self.transports[0].process_events(timeout)
+
+    def close(self):
+        for transport in self.transports:
+            transport.close()
+
+class _CompletedCall(object):
+    def block(self):
+        pass
+
+class StubTransport(Transport):
+    """A stand-in for the notification server, in the same process.
+
+    Nothing is displayed: the calls made are recorded in :attr:`calls`, and
+    the notifications currently 'open' in :attr:`notifications`. Use
+    :meth:`invoke_action` and :meth:`close_by_user` to simulate the user
+    interacting with a notification, and :meth:`stop_server` and
+    :meth:`start_server` for the server going away and coming back. Signals
+    are delivered immediately.
+    
+    This is useful for testing programs which use notify2, and for measuring
+    the overhead of notify2 itself.
+    """
+    name = 'stub'
+
+    def __init__(self, capabilities=('actions', 'body', 'body-markup',
+                                     'icon-static', 'persistence'),
+                 server_info=('notify2 stub', 'notify2', '1.0', '1.2')):
+        self.capabilities = list(capabilities)
+        self.server_info = tuple(server_info)
+        #: A list of (method name, arguments) tuples for the calls made.
+        self.calls = []
+        #: A dict mapping IDs to Notify arguments for open notifications.
+        self.notifications = {}
+        self._last_id = 0
+        self._handlers = None
+        self._is_tracked = None
+        self._server_changed = None
+        self._running = True
+    
+    receives_signals = True
+    
+    def _check_running(self):
+        if not self._running:
+            from notify2._wire import DBusError
+            raise DBusError('org.freedesktop.DBus.Error.ServiceUnknown',
+                            'The name %s was not provided by any .service '
+                            'files' % _SERVICE)
+    
+    def watch_server(self, server_changed):
+        self._server_changed = server_changed
+
+    def subscribe(self, action_invoked, notification_closed, is_tracked=None):
+        self._handlers = (action_invoked, notification_closed)
+        self._is_tracked = is_tracked
+
+    def unsubscribe(self):
+        self._handlers = None
+
+    def notify(self, args):
+        self._check_running()
+        self.calls.append(('Notify', args))
+        nid = args[1]
+        if nid not in self.notifications:
+            self._last_id += 1
+            nid = self._last_id
+        self.notifications[nid] = args
+        return nid
+
+    def notify_async(self, args, reply_handler, error_handler):
+        try:
+            nid = self.notify(args)
+        except Exception as e:
+            error_handler(e)
+        else:
+            reply_handler(nid)
+        return _CompletedCall()
+
+    def close_notification(self, nid):
+        self._check_running()
+        self.calls.append(('CloseNotification', (nid,)))
+        if self.notifications.pop(nid, None) is not None:
+            self._emit(1, nid, 3)   # 3: closed by CloseNotification
+
+    def get_capabilities(self):
+        self._check_running()
+        self.calls.append(('GetCapabilities', ()))
+        return list(self.capabilities)
+
+    def get_server_information(self):
+        self._check_running()
+        self.calls.append(('GetServerInformation', ()))
+        return self.server_info
+
+    def invoke_action(self, nid, action_key):
+        """Simulate the user clicking an action on notification *nid*."""
+        self._emit(0, nid, action_key)
+
+    def close_by_user(self, nid, reason=2):
+        """Simulate notification *nid* closing, by default because the user
+        dismissed it.
+        """
+        if self.notifications.pop(nid, None) is not None:
+            self._emit(1, nid, reason)
+
+    def replace_server(self, new_owner=':1.1000'):
+        """Simulate the server being replaced by another one."""
+        if self._server_changed is not None:
+            self._server_changed(new_owner)
+    
+    def stop_server(self):
+        """Simulate the server exiting. Its notifications are gone, and calls
+        fail until :meth:`start_server` is called.
+        """
+        self._running = False
+        self.notifications.clear()
+        if self._server_changed is not None:
+            self._server_changed('')
+    
+    def start_server(self, new_owner=':1.1001'):
+        """Simulate the server starting again after :meth:`stop_server`."""
+        self._running = True
+        if self._server_changed is not None:
+            self._server_changed(new_owner)
+    
+    def _emit(self, which, nid, arg):
+        if self._handlers is None:
+            return
+        if (self._is_tracked is not None) and not self._is_tracked(nid):
+            return
+        self._handlers[which](nid, arg)
+
+    def close(self):
+        self._handlers = self._server_changed = None
+
+backends = {
+    'dbus-python': DBusPythonTransport,
+    'socket': SocketTransport,
+    'stub': StubTransport,
+}
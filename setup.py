@@ -1,13 +1,6 @@
 from distutils.core import setup
 
-# To load the docstring, we need to be able to import dbus, but we don't
-# actually use it.
-try:
-    import dbus
-except ImportError:
-    import sys
-    sys.modules['dbus'] = object()
-
+# notify2 only imports dbus when it connects, so this works without it.
 import notify2
 long_description = notify2.__doc__
 
@@ -18,10 +11,14 @@ setup(name='notify2',
       author='Thomas Kluyver',
       author_email='takowl@gmail.com',
       url='https://bitbucket.org/takluyver/pynotify2',
-      py_modules=['notify2'],
+      packages=['notify2'],
       install_requires=[
           'dbus-python',
+          'futures; python_version < "3"',   # For show_async() and threaded mode
       ],
+      extras_require={
+          'aio': ['jeepney'],
+      },
       classifiers = [
         'License :: OSI Approved :: BSD License',
         'Programming Language :: Python',
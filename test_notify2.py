@@ -6,9 +6,27 @@ just smoke tests to check errors aren't raised.
 Running this may display several notifications.
 """
 
+import asyncio
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
 import unittest
+import zlib
 import notify2
-from gi.repository import GdkPixbuf
+import notify2.aio
+import notify2.transports
+from notify2.fake_server import PrivateBus, FakeNotificationServer
+try:
+    import dbus
+except ImportError:
+    dbus = None
+try:
+    from gi.repository import GdkPixbuf
+except ImportError:
+    GdkPixbuf = None
 
 class ModuleTests(unittest.TestCase):
     """Test module level functions.
@@ -23,6 +41,17 @@ class ModuleTests(unittest.TestCase):
         notify2.uninit()
         assert not notify2.is_initted()
     
+    def test_lazy_init(self):
+        notify2.uninit()
+        notify2.init("notify2 test suite", lazy=True)
+        assert notify2.is_initted()
+        assert isinstance(notify2.dbus_iface, notify2._LazyConnection)
+        
+        n = notify2.Notification("Lazy", "Connected when first shown")
+        n.show()
+        assert not isinstance(notify2.dbus_iface, notify2._LazyConnection)
+        n.close()
+    
     def test_get_server_info(self):
         r = notify2.get_server_info()
         assert isinstance(r, dict), type(r)
@@ -30,6 +59,923 @@ class ModuleTests(unittest.TestCase):
     def test_get_server_caps(self):
         r = notify2.get_server_caps()
         assert isinstance(r, list), type(r)
+    
+    def test_server_caps_cache(self):
+        caps = notify2.get_server_caps()
+        self.assertEqual(notify2.get_server_caps_set(), frozenset(caps))
+        notify2.invalidate_server_cache()
+        self.assertEqual(notify2.get_server_caps(), caps)
+
+class ImportTests(unittest.TestCase):
+    """Check that importing notify2 stays quick.
+    """
+    code = """
+import sys, time
+start = time.perf_counter()
+import notify2
+n = notify2.Notification("Summary", "Body", "dialog-information")
+n.set_category("device")
+n.set_timeout(notify2.EXPIRES_NEVER)
+n.set_urgency(notify2.URGENCY_CRITICAL)
+n.set_icon_from_buffer(b"\\xff\\x00\\x00\\xff" * 16, 4, 4)
+print(time.perf_counter() - start)
+print(" ".join(m for m in ("dbus", "concurrent.futures", "hashlib")
+               if m in sys.modules))
+"""
+    
+    def test_import_time(self):
+        here = os.path.dirname(os.path.abspath(__file__))
+        times = []
+        for i in range(3):
+            out = subprocess.check_output([sys.executable, '-c', self.code],
+                                          cwd=here, universal_newlines=True)
+            elapsed, heavy_modules = out.split('\n')[:2]
+            self.assertEqual(heavy_modules, '')
+            times.append(float(elapsed))
+        self.assertLess(min(times), 0.05)
+
+class WireTests(unittest.TestCase):
+    """Test the marshaller used by the socket backend.
+    """
+    def test_roundtrip(self):
+        from notify2 import _wire
+        icon = (2, 2, 8, True, 8, 4, bytes(bytearray(range(16))))
+        args = ("app", 3, "icon", "Summary \u2603", "Body", ["ok", "OK"],
+                {'urgency': ('y', 2), 'x': ('i', -5),
+                 'icon_data': ('(iiibiiay)', icon)}, -1)
+        data = _wire.marshal('susssasa{sv}i', args)
+        res = _wire.unmarshal('susssasa{sv}i', bytes(data))
+        self.assertEqual(res[:6], args[:6])
+        self.assertEqual(res[6], {'urgency': 2, 'x': -5, 'icon_data': icon})
+        self.assertEqual(res[7], -1)
+    
+    def test_message(self):
+        from notify2 import _wire
+        msg = _wire.method_call('org.freedesktop.Notifications',
+                                '/org/freedesktop/Notifications',
+                                'org.freedesktop.Notifications',
+                                'CloseNotification', 'u', (42,))
+        msg.serial = 7
+        data = msg.to_bytes()
+        parsed, length = _wire.parse_message(data + b'extra')
+        self.assertEqual(length, len(data))
+        self.assertEqual(parsed.serial, 7)
+        self.assertEqual(parsed.member, 'CloseNotification')
+        self.assertEqual(parsed.body, (42,))
+        self.assertEqual(_wire.parse_message(data[:-1]), (None, 0))
+
+class SocketBackendTests(unittest.TestCase):
+    """Test talking to the server without dbus-python.
+    """
+    def setUp(self):
+        notify2.init("notify2 test suite", backend='socket')
+    
+    def tearDown(self):
+        notify2.uninit()
+    
+    def test_server_info_caps(self):
+        r = notify2.get_server_info()
+        assert isinstance(r, dict), type(r)
+        r = notify2.get_server_caps()
+        assert isinstance(r, list), type(r)
+    
+    def test_show_close(self):
+        n = notify2.Notification("Socket", "Sent without dbus-python")
+        n.set_urgency(notify2.URGENCY_LOW)
+        n.set_icon_from_buffer(b'\xff\x00\x00\xff' * 64, 8, 8)
+        n.show()
+        assert n.id != 0
+        notify2.process_events()
+        n.close()
+
+class StubTransportTests(unittest.TestCase):
+    """Test the in-process stand-in for the server.
+    """
+    def setUp(self):
+        notify2.init("notify2 test suite", backend='stub')
+        self.stub = notify2._client._transport
+    
+    def tearDown(self):
+        notify2.uninit()
+    
+    def test_show_close(self):
+        closed = []
+        n = notify2.Notification("Stub", "Not displayed")
+        n.connect('closed', closed.append)
+        n.show()
+        self.assertEqual(self.stub.notifications[n.id][3], "Stub")
+        n.show()   # Replaces the notification
+        self.assertEqual(list(self.stub.notifications), [n.id])
+        n.close()
+        self.assertEqual(closed, [n])
+        self.assertEqual([c[0] for c in self.stub.calls],
+                         ['Notify', 'Notify', 'CloseNotification'])
+    
+    def test_action(self):
+        clicked = []
+        n = notify2.Notification("Stub", "With an action")
+        n.add_action("ok", "OK", lambda n, action: clicked.append(action))
+        n.show_async().result()
+        self.stub.invoke_action(n.id, "ok")
+        self.assertEqual(clicked, ["ok"])
+    
+    def test_server_changed(self):
+        caps = notify2.get_server_caps()
+        self.assertEqual(notify2.get_server_caps(), caps)
+        self.assertEqual(len(self.stub.calls), 1)
+        self.stub.capabilities.append('x-new')
+        self.stub.replace_server()
+        self.assertIn('x-new', notify2.get_server_caps())
+    
+    def test_only_track_callbacks(self):
+        notify2.notifications_registry.clear()
+        plain = notify2.Notification("Stub", "No callbacks")
+        plain.show()
+        assert not notify2._client._subscribed
+        self.assertNotIn(plain.id, notify2.notifications_registry)
+        
+        closed = []
+        n = notify2.Notification("Stub", "Closed callback")
+        n.connect('closed', closed.append)
+        n.show()
+        assert notify2._client._subscribed
+        self.assertIn(n.id, notify2.notifications_registry)
+        self.stub.close_by_user(plain.id)
+        self.stub.close_by_user(n.id)
+        self.assertEqual(closed, [n])
+    
+    def test_unsubscribe_when_idle(self):
+        notify2.notifications_registry.clear()
+        n1 = notify2.Notification("Stub", "First")
+        n1.add_action("ok", "OK", notify2.no_op)
+        n2 = notify2.Notification("Stub", "Second")
+        n2.connect('closed', lambda n: None)
+        n1.show()
+        n2.show_async().result()
+        assert notify2._client._subscribed
+        
+        self.stub.close_by_user(n1.id)
+        assert notify2._client._subscribed
+        self.stub.close_by_user(n2.id)
+        assert not notify2._client._subscribed
+        self.assertIsNone(self.stub._handlers)
+        
+        n1.show()   # Subscribes again
+        assert notify2._client._subscribed
+        self.assertIsNotNone(self.stub._handlers)
+    
+    def test_unsubscribe_when_idle_lazy(self):
+        # Connecting lazily, while subscribing for the first notification,
+        # doesn't lose count of the notifications waiting for their IDs.
+        for threaded in (False, True):
+            notify2.uninit()
+            notify2.init("notify2 test suite", backend='stub', lazy=True,
+                         threaded=threaded)
+            n = notify2.Notification("Stub", "Lazy")
+            n.connect('closed', lambda n: None)
+            result = n.show()
+            if threaded:
+                result.result()
+            client = notify2._client
+            self.assertEqual(client._showing, 0)
+            assert client._subscribed
+            client._transport.close_by_user(n.id)
+            notify2.get_server_info()   # Waits for the sender thread
+            assert not client._subscribed
+    
+    def test_template_copy_on_write(self):
+        proto = notify2.Notification("")
+        proto.set_urgency(notify2.URGENCY_CRITICAL)
+        proto.add_action("ack", "Acknowledge", notify2.no_op)
+        template = notify2.NotificationTemplate(proto)
+        n1 = template.new("First")
+        n2 = template.new("Second")
+        snoozed = []
+        n1.add_action("snooze", "Snooze",
+                      lambda n, action: snoozed.append(action))
+        n1.set_urgency(notify2.URGENCY_LOW)
+        
+        n1.show()
+        n2.show()
+        args1 = self.stub.notifications[n1.id]
+        args2 = self.stub.notifications[n2.id]
+        self.assertEqual(args1[5], ["ack", "Acknowledge", "snooze", "Snooze"])
+        self.assertEqual(args1[6]['urgency'], notify2.URGENCY_LOW)
+        # The template and the other notification are unchanged.
+        self.assertEqual(args2[5], ["ack", "Acknowledge"])
+        self.assertEqual(args2[6]['urgency'], notify2.URGENCY_CRITICAL)
+        self.assertEqual(list(template.actions), ["ack"])
+        
+        self.stub.invoke_action(n1.id, "snooze")
+        self.assertEqual(snoozed, ["snooze"])
+    
+    def test_subclass_defaults(self):
+        # Subclasses can still override these defaults as class attributes.
+        closed = []
+        
+        class Alert(notify2.Notification):
+            timeout = 10000
+            
+            def _closed_callback(self, n):
+                closed.append(n)
+        
+        n = Alert("Stub", "Subclass")
+        self.assertEqual(n.timeout, 10000)
+        self.assertEqual(n.id, 0)
+        n.show()
+        self.assertEqual(self.stub.notifications[n.id][7], 10000)
+        self.stub.close_by_user(n.id)
+        self.assertEqual(closed, [n])
+        
+        n.timeout = 5000   # Instances can still change them
+        self.assertEqual(n.timeout, 5000)
+        self.assertEqual(Alert("Another").timeout, 10000)
+        self.assertEqual(notify2.Notification("Plain").timeout,
+                         notify2.EXPIRES_DEFAULT)
+    
+    def test_transport_instance(self):
+        notify2.uninit()
+        stub = notify2.transports.StubTransport(server_info=('a', 'b', 'c', 'd'))
+        notify2.init("notify2 test suite", lazy=True, backend=stub)
+        self.assertEqual(notify2.get_server_info()['name'], 'a')
+        self.assertIs(notify2._client._transport, stub)
+
+class ClientTests(unittest.TestCase):
+    """Test several clients in one process.
+    """
+    def setUp(self):
+        notify2.init("notify2 test suite", backend='stub')
+        self.client = notify2.NotificationClient("second client",
+                                                 backend='stub')
+    
+    def tearDown(self):
+        self.client.uninit()
+        notify2.uninit()
+    
+    def test_separate_clients(self):
+        default_stub = notify2._client._transport
+        stub = self.client._transport
+        n1 = notify2.Notification("Default")
+        n1.show()
+        n2 = notify2.Notification("Second", client=self.client)
+        n2.show()
+        n2.close()
+        self.assertEqual(default_stub.notifications[n1.id][0],
+                         "notify2 test suite")
+        self.assertEqual([c[1][0] for c in stub.calls if c[0] == 'Notify'],
+                         ["second client"])
+        self.assertEqual(stub.notifications, {})
+    
+    def test_callbacks(self):
+        clicked = []
+        n = notify2.Notification("Second", client=self.client)
+        n.add_action("ok", "OK", lambda n, action: clicked.append(action))
+        n.show()
+        self.assertIn(n.id, self.client.registry)
+        self.assertNotIn(n.id, notify2.notifications_registry)
+        assert not notify2._client._subscribed
+        
+        self.client._transport.invoke_action(n.id, "ok")
+        self.assertEqual(clicked, ["ok"])
+    
+    def test_template(self):
+        proto = notify2.Notification("", client=self.client)
+        n = notify2.NotificationTemplate(proto).new("From template")
+        n.show()
+        self.assertIn(n.id, self.client._transport.notifications)
+    
+    def test_init_again(self):
+        self.client.uninit()
+        self.client.init("second client", backend='stub', threaded=True)
+        self.client.get_server_info()   # Connects
+        old_transport = self.client._transport
+        old_sender = self.client._sender
+        self.client.init("second client again", backend='stub')
+        # The old connection is closed, and its thread stopped
+        self.assertIsNone(old_transport._server_changed)
+        self.assertFalse(old_sender._thread.is_alive())
+        self.assertIsNone(self.client._sender)
+        self.assertEqual(self.client.app_name, "second client again")
+    
+    def test_server_caps_cache(self):
+        self.client._transport.capabilities.append('x-second')
+        self.assertIn('x-second', self.client.get_server_caps_set())
+        self.assertNotIn('x-second', notify2.get_server_caps_set())
+
+@unittest.skipUnless(shutil.which('dbus-daemon'), "Needs dbus-daemon")
+class FakeServerTests(unittest.TestCase):
+    """Test the whole send/callback path against the fake server, on a
+    private bus.
+    """
+    @classmethod
+    def setUpClass(cls):
+        cls.bus = PrivateBus().start()
+    
+    @classmethod
+    def tearDownClass(cls):
+        cls.bus.stop()
+    
+    def setUp(self):
+        self.server = FakeNotificationServer().start()
+        notify2.init("notify2 test suite", backend='socket')
+    
+    def tearDown(self):
+        notify2.uninit()
+        self.server.stop()
+    
+    def test_show_callbacks(self):
+        events = []
+        n = notify2.Notification("Fake", "Recorded")
+        n.set_urgency(notify2.URGENCY_CRITICAL)
+        n.add_action("ok", "OK", lambda n, action: events.append(action))
+        n.connect('closed', lambda n: events.append('closed'))
+        n.show()
+        args = self.server.notifications[n.id]
+        self.assertEqual(args[3], "Fake")
+        self.assertEqual(args[6]['urgency'], notify2.URGENCY_CRITICAL)
+        
+        self.server.invoke_action(n.id, "ok")
+        self.server.close_notification(n.id)
+        while len(events) < 2:
+            notify2.process_events(1)
+        self.assertEqual(events, ["ok", "closed"])
+    
+    def test_hint_types(self):
+        n = notify2.Notification("Fake", "Hints of several types")
+        n.set_hint('x-list', ['a', 'b'])
+        n.set_hint('x-big', 2**40)
+        n.set_hint('x-float', 0.5)
+        n.show()
+        hints = self.server.notifications[n.id][6]
+        self.assertEqual(hints['x-list'], ['a', 'b'])
+        self.assertEqual(hints['x-big'], 2**40)
+        self.assertEqual(hints['x-float'], 0.5)
+        
+        n.set_hint('x-object', object())
+        with self.assertRaises(TypeError):
+            n.show()
+    
+    def test_template_hints_converted_once(self):
+        proto = notify2.Notification("")
+        proto.set_urgency(notify2.URGENCY_CRITICAL)
+        template = notify2.NotificationTemplate(proto)
+        template.new("First").show()
+        variants = template.hints.variants
+        self.assertEqual(variants, {'urgency': ('y', notify2.URGENCY_CRITICAL)})
+        
+        n2 = template.new("Second")
+        n2.show()
+        self.assertIs(template.hints.variants, variants)
+        hints = self.server.notifications[n2.id][6]
+        self.assertEqual(hints['urgency'], notify2.URGENCY_CRITICAL)
+        
+        # A notification with hints of its own doesn't use the conversion
+        n3 = template.new("Third")
+        n3.set_category('device')
+        n3.show()
+        hints = self.server.notifications[n3.id][6]
+        self.assertEqual(hints['category'], 'device')
+        self.assertIs(template.hints.variants, variants)
+
+    def test_dispatch_thread(self):
+        notify2.uninit()
+        notify2.init("notify2 test suite", mainloop='thread', backend='socket')
+        import threading
+        clicked = threading.Event()
+        n = notify2.Notification("Fake", "Callbacks from a thread")
+        n.add_action("ok", "OK", lambda n, action: clicked.set())
+        n.show()
+        self.server.invoke_action(n.id, "ok")
+        assert clicked.wait(5)
+        # Method calls still work while the thread is reading messages
+        self.assertEqual(notify2.get_server_info()['name'],
+                         "notify2 fake server")
+        self.assertRaises(RuntimeError, notify2.process_events)
+    
+    def test_signal_before_reply_handled(self):
+        # A server which closes each notification as soon as it's replied
+        class ClosingServer(FakeNotificationServer):
+            def _handle(self, msg):
+                FakeNotificationServer._handle(self, msg)
+                if msg.member == 'Notify':
+                    self.close_notification(self._last_id)
+        
+        self.server.stop()
+        self.server = ClosingServer().start()
+        notify2.uninit()
+        notify2.init("notify2 test suite", mainloop='thread', backend='socket')
+        closed = []
+        for i in range(20):
+            n = notify2.Notification("Closed at once %d" % i)
+            n.connect('closed', closed.append)
+            n.show()
+        deadline = time.time() + 5
+        while len(closed) < 20 and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(len(closed), 20)
+        self.assertEqual(len(notify2.notifications_registry), 0)
+    
+    def test_server_restart(self):
+        client = notify2.NotificationClient()
+        client.reconnect_delay = 0.05
+        client.init("notify2 test suite", backend='socket', reconnect=True)
+        self.server.stop()
+        import threading
+        restart = threading.Timer(0.3, self.server.start)
+        restart.start()
+        try:
+            notifications = [notify2.Notification("Held %d" % i,
+                                                  client=client)
+                             for i in range(3)]
+            ids = notify2.show_many(notifications)
+            self.assertEqual(sorted(self.server.notifications), sorted(ids))
+        finally:
+            restart.join()
+            client.uninit()
+    
+    def test_signals_from_server_only(self):
+        clicked = []
+        n = notify2.Notification("Fake", "Only from the server")
+        n.add_action("ok", "OK", lambda n, action: clicked.append(action))
+        n.show()
+        # Another program on the bus sending the same signal is ignored.
+        other = notify2._wire.Connection.session_bus()
+        other.send(notify2._wire.signal(notify2._PATH, notify2._INTERFACE,
+                                        'ActionInvoked', 'us', (n.id, "ok")))
+        # As are signals about notifications we aren't tracking.
+        self.server.invoke_action(n.id + 1000, "ok")
+        self.server.invoke_action(n.id, "ok")
+        while not clicked:
+            notify2.process_events(1)
+        notify2.process_events(0.1)
+        self.assertEqual(clicked, ["ok"])
+        other.close()
+        
+        # Stop listening once no notifications need callbacks
+        self.server.close_notification(n.id)
+        while notify2._client._subscribed:
+            notify2.process_events(1)
+        self.assertEqual(notify2._client._transport._signal_matches, [])
+    
+    def test_latency(self):
+        self.server.latency = 0.05
+        self.assertEqual(notify2.get_server_info()['name'],
+                         "notify2 fake server")
+        start = time.time()
+        notify2.show_many([notify2.Notification("Fake %d" % i)
+                           for i in range(3)])
+        self.assertGreaterEqual(time.time() - start, 0.15)
+        self.assertEqual([c[0] for c in self.server.calls],
+                         ['GetServerInformation'] + ['Notify'] * 3)
+    
+    def test_wire_calls_from_threads(self):
+        import threading
+        conn = notify2._wire.Connection.session_bus()
+        done = []
+        
+        def call():
+            for i in range(200):
+                conn.call(notify2._wire.BUS_NAME, notify2._wire.BUS_PATH,
+                          notify2._wire.BUS_INTERFACE, 'GetId')
+            done.append(1)
+        
+        threads = [threading.Thread(target=call) for i in range(4)]
+        for t in threads:
+            t.daemon = True
+            t.start()
+        for t in threads:
+            t.join(10)
+        conn.close()
+        self.assertEqual(len(done), 4)
+    
+    def test_wire_timeout(self):
+        # Another connection which never reads its messages
+        silent = notify2._wire.Connection.session_bus()
+        conn = notify2._wire.Connection.session_bus()
+        try:
+            with self.assertRaises(notify2._wire.DBusError) as cm:
+                conn.call(silent.unique_name, '/', 'org.example.Silent',
+                          'Hello', timeout=0.2)
+            self.assertEqual(cm.exception.get_dbus_name(),
+                             'org.freedesktop.DBus.Error.NoReply')
+            self.assertTrue(notify2.transports.connection_lost(cm.exception))
+        finally:
+            conn.close()
+            silent.close()
+    
+    def test_result_timeout(self):
+        from concurrent.futures import TimeoutError
+        self.server.stop()
+        self.server = FakeNotificationServer(latency=0.5).start()
+        n = notify2.Notification("Fake", "Slow to reply")
+        f = n.show_async()
+        start = time.time()
+        with self.assertRaises(TimeoutError):
+            f.result(timeout=0.05)
+        self.assertLess(time.time() - start, 0.4)
+        # The call is still waiting for its reply
+        self.assertEqual(f.result(), n.id)
+        assert n.id != 0
+    
+    def test_connection_pool(self):
+        notify2.uninit()
+        notify2.init("notify2 test suite", backend='socket', connections=3)
+        pool = notify2._client._transport
+        self.assertIsInstance(pool, notify2.transports.PooledTransport)
+        notifications = [notify2.Notification("Pooled %d" % i)
+                         for i in range(6)]
+        notify2.show_many(notifications)
+        routes = pool._routes
+        self.assertEqual(sorted(routes.values()), [0, 0, 1, 1, 2, 2])
+        
+        # Replacing and closing use the connection it was shown on
+        n = notifications[4]
+        route = routes[n.id]
+        n.update("Replaced")
+        n.show()
+        self.assertEqual(routes[n.id], route)
+        self.assertEqual(self.server.notifications[n.id][3], "Replaced")
+        n.close()
+        self.assertNotIn(n.id, routes)
+        self.assertNotIn(n.id, self.server.notifications)
+    
+    def test_connection_pool_threaded(self):
+        notify2.uninit()
+        notify2.init("notify2 test suite", backend='socket', threaded=True,
+                     connections=4)
+        notifications = [notify2.Notification("Pooled %d" % i)
+                         for i in range(16)]
+        ids = [f.result() for f in [n.show() for n in notifications]]
+        self.assertEqual(len(set(ids)), 16)
+        routes = notify2._client._transport._routes
+        self.assertEqual(set(routes.values()), set(range(4)))
+        for f in [n.close() for n in notifications]:
+            f.result()
+        self.assertEqual(self.server.notifications, {})
+    
+    def test_process_events_threaded(self):
+        notify2.uninit()
+        notify2.init("notify2 test suite", backend='socket', threaded=True)
+        import threading
+        stop = threading.Event()
+        closed = []
+        
+        def pump():
+            while not stop.is_set():
+                notify2.process_events(0.01)
+        
+        pumper = threading.Thread(target=pump)
+        pumper.start()
+        try:
+            notifications = [notify2.Notification("Threaded %d" % i)
+                             for i in range(300)]
+            for n in notifications[:10]:
+                n.connect('closed', closed.append)
+            futures = [n.show() for n in notifications]
+            ids = [f.result(timeout=10) for f in futures]
+            self.assertEqual(len(set(ids)), 300)
+            for n in notifications[:10]:
+                self.server.close_notification(n.id)
+            deadline = time.time() + 5
+            while len(closed) < 10 and time.time() < deadline:
+                time.sleep(0.01)
+            self.assertEqual(len(closed), 10)
+        finally:
+            stop.set()
+            pumper.join()
+
+class ThreadedTests(unittest.TestCase):
+    """Test sending from several threads through the sender thread.
+    """
+    def setUp(self):
+        notify2.init("notify2 test suite", backend='stub', threaded=True)
+    
+    def tearDown(self):
+        notify2.uninit()
+    
+    def test_many_threads(self):
+        import threading
+        futures = []
+        closed = []
+        
+        def send(i):
+            for j in range(50):
+                n = notify2.Notification("Thread %d" % i, str(j))
+                n.connect('closed', closed.append)
+                futures.append((n, n.show()))
+        
+        threads = [threading.Thread(target=send, args=(i,)) for i in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        
+        ids = [f.result() for n, f in futures]
+        self.assertEqual(len(set(ids)), 400)
+        self.assertEqual(len(notify2.notifications_registry), 400)
+        for n, f in futures:
+            n.close()
+        notify2.get_server_info()   # Waits for the calls before it
+        self.assertEqual(len(closed), 400)
+        self.assertEqual(len(notify2.notifications_registry), 0)
+    
+    def test_show_twice(self):
+        n = notify2.Notification("Threaded", "First")
+        first = n.show()
+        n.update("Threaded", "Second")
+        second = n.show()
+        self.assertEqual(first.result(), second.result())
+        stub = notify2._client._transport
+        self.assertEqual([args[4] for method, args in stub.calls],
+                         ["First", "Second"])
+    
+    def test_coalescing_sender(self):
+        import threading
+        sender = notify2.CoalescingSender()
+        thread = notify2._client._sender
+        # Keep the sender thread busy, so both are queued before either is
+        # sent.
+        go = threading.Event()
+        thread.submit(go.wait)
+        n1 = notify2.Notification("Build failed", "1 failure")
+        n2 = notify2.Notification("Build failed", "2 failures")
+        sender.send(n1, key='build')
+        sender.send(n2, key='build')
+        go.set()
+        thread.call(notify2.no_op)   # Wait for both to be sent
+        
+        self.assertEqual(n2.id, n1.id)
+        stub = notify2._client._transport
+        self.assertEqual(list(stub.notifications), [n1.id])
+
+class ReconnectTests(unittest.TestCase):
+    """Test holding notifications while the server is gone, and sending them
+    once it's back.
+    """
+    def setUp(self):
+        self.stub = notify2.transports.StubTransport()
+        self.client = notify2.NotificationClient()
+        self.client.reconnect_delay = 0.05
+        self.client.max_reconnect_delay = 0.2
+    
+    def tearDown(self):
+        self.client.uninit()
+    
+    def test_hold_until_server_back(self):
+        self.client.init("notify2 test suite", backend=self.stub,
+                         reconnect=True)
+        closed = []
+        self.stub.stop_server()
+        n = notify2.Notification("Held", client=self.client)
+        n.connect('closed', closed.append)
+        self.assertFalse(n.show())
+        future = notify2.Notification("Held too", client=self.client) \
+                        .show_async()
+        self.assertFalse(future.done())
+        self.assertEqual(len(self.client._outbox), 2)
+        
+        self.stub.start_server()
+        self.assertEqual(future.result(timeout=1), 2)
+        self.assertEqual(n.id, 1)
+        self.assertEqual(len(self.client._outbox), 0)
+        # Signals are subscribed to again for the held notification.
+        self.stub.close_by_user(n.id)
+        self.assertEqual(closed, [n])
+    
+    def test_coalesce_held(self):
+        self.client.init("notify2 test suite", backend=self.stub,
+                         reconnect=True)
+        sender = notify2.CoalescingSender()
+        self.stub.stop_server()
+        n1 = notify2.Notification("Build failed", "1 failure",
+                                  client=self.client)
+        n2 = notify2.Notification("Build failed", "2 failures",
+                                  client=self.client)
+        sender.send(n1, key='build')
+        sender.send(n2, key='build')
+        
+        self.stub.start_server()
+        self.assertEqual(len(self.client._outbox), 0)
+        # Both are shown in one popup
+        self.assertEqual(n2.id, n1.id)
+        self.assertEqual(list(self.stub.notifications), [n1.id])
+    
+    def test_backoff(self):
+        self.client.init("notify2 test suite", backend=self.stub,
+                         reconnect=True)
+        self.stub.stop_server()
+        n = notify2.Notification("Held", client=self.client)
+        self.assertFalse(n.show())
+        self.assertEqual(self.client._retry_delay, 0.1)
+        time.sleep(0.06)
+        # Reconnecting works, but the server is still gone
+        self.assertFalse(notify2.Notification("Held too",
+                                              client=self.client).show())
+        self.assertEqual(self.client._retry_delay, 0.2)
+        
+        self.stub._running = True   # Without the signal
+        time.sleep(0.11)
+        self.assertTrue(notify2.Notification("Sent",
+                                             client=self.client).show())
+        self.assertEqual([args[3] for method, args in self.stub.calls],
+                         ["Held", "Held too", "Sent"])
+        self.assertEqual(self.client._retry_delay, 0.05)
+    
+    def test_result_retries(self):
+        self.client.init("notify2 test suite", backend=self.stub,
+                         reconnect=True)
+        self.stub.stop_server()
+        futures = [notify2.Notification(str(i), client=self.client)
+                   .show_async() for i in range(2)]
+        with self.assertRaises(Exception):   # TimeoutError
+            futures[0].result(timeout=0.01)
+        self.stub._running = True   # Without the signal
+        # Waiting for the result tries to reconnect, after the delay
+        self.assertEqual([f.result(timeout=2) for f in futures], [1, 2])
+    
+    def test_calls_while_down(self):
+        self.client.init("notify2 test suite", backend=self.stub,
+                         reconnect=True)
+        self.stub.stop_server()
+        notify2.Notification("Held", client=self.client).show()
+        delay = self.client._retry_delay
+        for i in range(3):
+            self.assertRaises(notify2._wire.DBusError,
+                              self.client.get_server_info)
+        # Failed calls don't add to the backoff; only reconnecting does.
+        self.assertEqual(self.client._retry_delay, delay)
+        self.assertEqual(self.stub.calls, [])
+    
+    def test_reconnect_when_server_back(self):
+        self.client.init("notify2 test suite", backend='stub',
+                         reconnect=True)
+        old = self.client._transport
+        old.stop_server()
+        n = notify2.Notification("Held", client=self.client)
+        self.assertFalse(n.show())
+        old.start_server()
+        # Held notifications are sent over a new connection
+        self.assertIsNot(self.client._transport, old)
+        self.assertIn(n.id, self.client._transport.notifications)
+    
+    def test_outbox_bounded(self):
+        self.client.outbox_size = 2
+        self.client.init("notify2 test suite", backend=self.stub,
+                         reconnect=True)
+        self.stub.stop_server()
+        n = notify2.Notification("Closed", client=self.client)
+        n.show()
+        n.close()   # Drops it from the outbox
+        futures = [notify2.Notification(str(i), client=self.client)
+                   .show_async() for i in range(3)]
+        self.assertRaises(Exception, futures[0].result, 0)
+        self.stub.start_server()
+        self.assertEqual([args[3] for method, args in self.stub.calls],
+                         ["1", "2"])
+    
+    def test_threaded(self):
+        self.client.init("notify2 test suite", backend=self.stub,
+                         threaded=True, reconnect=True)
+        self.stub.stop_server()
+        future = notify2.Notification("Held", client=self.client).show()
+        self.stub._running = True   # Without the signal
+        # The sender thread retries after the delay by itself
+        self.assertEqual(future.result(timeout=2), 1)
+    
+    def test_other_errors(self):
+        self.client.init("notify2 test suite", backend=self.stub,
+                         reconnect=True)
+        n = notify2.Notification("Bad", client=self.client)
+        def notify(args):
+            raise ValueError("Not about the connection")
+        self.stub.notify = notify
+        self.assertRaises(ValueError, n.show)
+        self.assertFalse(self.client._down)
+
+class CallbackExecutorTests(unittest.TestCase):
+    """Test running callbacks in a thread pool or an event loop.
+    """
+    def setUp(self):
+        notify2.init("notify2 test suite", backend='stub')
+        self.stub = notify2._client._transport
+    
+    def tearDown(self):
+        notify2.set_callback_executor(None)
+        notify2.uninit()
+    
+    def test_thread_pool(self):
+        import threading
+        from concurrent.futures import ThreadPoolExecutor
+        pool = ThreadPoolExecutor(4)
+        notify2.set_callback_executor(pool)
+        events = []
+        fast_done = threading.Event()
+        
+        slow = notify2.Notification("Slow")
+        slow.add_action("ack", "Acknowledge",
+                        lambda n, action: (time.sleep(0.2),
+                                           events.append('slow ack')))
+        slow.connect('closed', lambda n: events.append('slow closed'))
+        fast = notify2.Notification("Fast")
+        fast.add_action("ack", "Acknowledge",
+                        lambda n, action: fast_done.set())
+        slow.show()
+        fast.show()
+        
+        self.stub.invoke_action(slow.id, "ack")
+        self.stub.close_by_user(slow.id)
+        self.stub.invoke_action(fast.id, "ack")
+        assert fast_done.wait(0.15)   # Not held up by the slow callback
+        pool.shutdown(wait=True)
+        self.assertEqual(events, ['slow ack', 'slow closed'])
+    
+    def test_event_loop(self):
+        events = []
+        
+        async def acknowledge(n, action):
+            await asyncio.sleep(0.01)
+            events.append(action)
+        
+        async def main():
+            notify2.set_callback_executor(asyncio.get_running_loop())
+            n = notify2.Notification("Async callbacks")
+            n.add_action("ack", "Acknowledge", acknowledge)
+            n.connect('closed', lambda n: events.append('closed'))
+            n.show()
+            self.stub.invoke_action(n.id, "ack")
+            self.stub.close_by_user(n.id)
+            for i in range(50):
+                await asyncio.sleep(0.005)
+                if len(events) == 2:
+                    break
+        
+        asyncio.run(main())
+        self.assertEqual(events, ['ack', 'closed'])
+
+class RegistryTests(unittest.TestCase):
+    """Test the registry of notifications waiting for callbacks.
+    """
+    def test_max_size(self):
+        reg = notify2.NotificationRegistry(max_size=3)
+        ns = [notify2.Notification("N%d" % i) for i in range(5)]
+        for i, n in enumerate(ns):
+            reg[i] = n
+        self.assertEqual(sorted(reg), [2, 3, 4])
+        
+        reg[2]  # Using it makes it most recently used
+        reg[5] = ns[0]
+        self.assertEqual(sorted(reg), [2, 4, 5])
+    
+    def test_expiry(self):
+        now = [0.0]
+        reg = notify2.NotificationRegistry(grace=10, default_ttl=100)
+        reg._clock = lambda: now[0]
+        n_short = notify2.Notification("Short")
+        n_short.set_timeout(5000)
+        n_default = notify2.Notification("Default")
+        n_never = notify2.Notification("Never")
+        n_never.set_timeout(notify2.EXPIRES_NEVER)
+        reg[1], reg[2], reg[3] = n_short, n_default, n_never
+        
+        now[0] = 20
+        reg.expire()
+        self.assertEqual(sorted(reg), [2, 3])
+        now[0] = 1000
+        reg.expire()
+        self.assertEqual(sorted(reg), [3])
+    
+    def test_weak(self):
+        reg = notify2.NotificationRegistry(weak=True)
+        n = notify2.Notification("Weak")
+        reg[1] = n
+        self.assertIs(reg[1], n)
+        del n
+        import gc; gc.collect()
+        self.assertEqual(len(reg), 0)
+    
+    def test_weak_on_empty(self):
+        emptied = []
+        reg = notify2.NotificationRegistry(weak=True)
+        reg.on_empty = lambda: emptied.append(True)
+        n = notify2.Notification("Weak")
+        reg[1] = n
+        del n
+        import gc; gc.collect()
+        # Not from inside garbage collection, but on the next operation
+        self.assertEqual(emptied, [])
+        self.assertIsNone(reg.get(1))
+        self.assertEqual(emptied, [True])
+    
+    def test_dict_methods(self):
+        reg = notify2.NotificationRegistry(weak=True)
+        ns = [notify2.Notification("N%d" % i) for i in range(3)]
+        for i, n in enumerate(ns):
+            reg[i] = n
+        del ns[1]
+        import gc; gc.collect()
+        self.assertEqual(reg.keys(), [0, 2])
+        self.assertEqual(reg.values(), ns)
+        self.assertEqual(reg.items(), [(0, ns[0]), (2, ns[1])])
 
 class NotificationTests(unittest.TestCase):
     """Test notifications.
@@ -42,6 +988,22 @@ class NotificationTests(unittest.TestCase):
         n.show()
         n.close()
     
+    def test_show_async(self):
+        n = notify2.Notification("Async", "Sent without waiting for the reply")
+        f = n.show_async()
+        nid = f.result()
+        assert isinstance(nid, int), type(nid)
+        self.assertEqual(n.id, nid)
+        n.close()
+    
+    def test_show_many(self):
+        ns = [notify2.Notification("Burst", "Message %d" % i) for i in range(5)]
+        ids = notify2.show_many(ns)
+        self.assertEqual(ids, [n.id for n in ns])
+        self.assertEqual(len(set(ids)), 5)
+        for n in ns:
+            n.close()
+    
     def test_icon(self):
         n = notify2.Notification("MLK", "I have a dream", "notification-message-im")
         n.show()
@@ -109,6 +1071,7 @@ class NotificationTests(unittest.TestCase):
         self.assertEqual(n.data['b'], 2)
         n.close()
     
+    @unittest.skipUnless(GdkPixbuf, "Needs PyGObject")
     def test_icon_from_pixbuf(self):
         pb = GdkPixbuf.Pixbuf.new_from_file("examples/applet-critical.png")
         n = notify2.Notification("Icon", "Testing icon from pixbuf")
@@ -116,11 +1079,314 @@ class NotificationTests(unittest.TestCase):
         n.show()
         n.close()
     
+    @unittest.skipUnless(GdkPixbuf, "Needs PyGObject")
+    def test_icon_from_buffer(self):
+        pb = GdkPixbuf.Pixbuf.new_from_file("examples/applet-critical.png")
+        data = memoryview(pb.get_pixels())
+        n = notify2.Notification("Icon", "Testing icon from a buffer")
+        n.set_icon_from_buffer(data, pb.get_width(), pb.get_height(),
+                               rowstride=pb.get_rowstride(),
+                               has_alpha=pb.get_has_alpha(),
+                               channels=pb.get_n_channels())
+        n.show()
+        n.close()
+        
+        with self.assertRaises(ValueError):
+            n.set_icon_from_buffer(b'\0' * 10, 16, 16)
+    
     def test_set_location(self):
         n = notify2.Notification("Location", "Test setting location")
         n.set_location(320, 240)
         n.show()
         n.close()
 
+class NotificationLogicTests(unittest.TestCase):
+    """Test notification features that don't need a notification server,
+    using the stub transport.
+    """
+    def setUp(self):
+        notify2.init("notify2 test suite", backend='stub')
+    
+    def tearDown(self):
+        notify2.uninit()
+    
+    def test_coalescing_sender(self):
+        sender = notify2.CoalescingSender(window=60, rate=1, burst=2)
+        now = [0.0]
+        sender._clock = lambda: now[0]
+        sender._last_refill = now[0]
+        
+        n1 = notify2.Notification("Build failed", "1 failure")
+        n2 = notify2.Notification("Build failed", "2 failures")
+        assert sender.send(n1, key='build')
+        assert sender.send(n2, key='build')
+        # Coalesced into the same popup
+        self.assertEqual(n2.id, n1.id)
+        
+        # Over the rate limit: only the newest of these is kept
+        n3 = notify2.Notification("Build failed", "3 failures")
+        n4 = notify2.Notification("Build failed", "4 failures")
+        assert not sender.send(n3, key='build')
+        assert not sender.send(n4, key='build')
+        self.assertEqual(sender.flush(), 1)
+        now[0] += 1
+        self.assertEqual(sender.flush(), 0)
+        self.assertEqual(n3.id, 0)
+        self.assertEqual(n4.id, n1.id)
+        n4.close()
+    
+    def test_template(self):
+        proto = notify2.Notification("", icon="notification-message-im")
+        proto.set_urgency(notify2.URGENCY_CRITICAL)
+        proto.set_category('im.received')
+        proto.set_timeout(5000)
+        template = notify2.NotificationTemplate(proto)
+        
+        for i in range(3):
+            n = template.new("Template", "Message %d" % i)
+            self.assertEqual(n.icon, "notification-message-im")
+            self.assertEqual(n.timeout, 5000)
+            n.show()
+            n.close()
+    
+    def test_compact(self):
+        n = notify2.Notification("Plain")
+        assert not hasattr(n, '__dict__')
+        assert n._hints is None and n._actions is None and n._data is None
+        n.show()
+        assert n._hints is None and n._actions is None
+        n.set_category('im.received')
+        self.assertEqual(n.hints, {'category': 'im.received'})
+        n.close()
+    
+    def test_icon_downscale(self):
+        data = b'\xff\x00\x00\xff' * (256 * 256)
+        n = notify2.Notification("Icon", "Testing a scaled icon")
+        n.set_icon_from_buffer(data, 256, 256, max_size=64)
+        icon = n.hints['icon_data']
+        self.assertEqual(tuple(icon[:3]), (64, 64, 256))
+        self.assertEqual(bytes(icon[6][:4]), b'\xff\x00\x00\xff')
+        
+        # The same pixels again reuse the cached icon
+        n2 = notify2.Notification("Icon", "Testing a cached icon")
+        n2.set_icon_from_buffer(data, 256, 256, max_size=64)
+        assert n2.hints['icon_data'] is icon
+        n2.show()
+        n2.close()
+    
+    def test_icon_ready_to_send(self):
+        n = notify2.Notification("Icon", "Testing a converted icon")
+        n.set_icon_from_buffer(bytearray(b'\x80' * (16 * 16 * 4)), 16, 16)
+        icon = n.hints['icon_data']
+        self.assertIsInstance(icon[6], bytes)
+        # The socket backend sends it as it is
+        self.assertIs(notify2._hint_variant('icon_data', icon)[1], icon)
+        
+        # Buffers of larger items are used as their bytes
+        import array
+        pixels = array.array('I', [0x80ff00ff] * (4 * 4))
+        n.set_icon_from_buffer(pixels, 4, 4)
+        self.assertEqual(n.hints['icon_data'][6], pixels.tobytes())
+    
+    @unittest.skipUnless(dbus, "Needs dbus-python")
+    def test_icon_converted_once(self):
+        n = notify2.Notification("Icon", "Testing a converted icon")
+        n.set_icon_from_buffer(b'\x80' * (16 * 16 * 4), 16, 16)
+        struct1 = notify2._dbus_hints(n.hints)['icon_data']
+        struct2 = notify2._dbus_hints(n.hints)['icon_data']
+        self.assertIs(struct2, struct1)
+        self.assertEqual(struct1.signature, 'iiibiiay')
+        
+        # Scaled icons from the cache share the prepared struct
+        data = b'\xff\x00\x00\xff' * (256 * 256)
+        structs = []
+        for i in range(2):
+            n = notify2.Notification("Icon", "Testing a cached icon")
+            n.set_icon_from_buffer(data, 256, 256, max_size=64)
+            structs.append(notify2._dbus_hints(n.hints)['icon_data'])
+        self.assertIs(structs[1], structs[0])
+    
+    def test_icon_file_cache(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        notify2.icon_file_cache = notify2.IconFileCache(tmpdir)
+        self.addCleanup(setattr, notify2, 'icon_file_cache', None)
+        
+        data = b'\x00\x80\xff\xff' * (32 * 32)
+        n = notify2.Notification("Icon", "Testing an icon file")
+        n.set_icon_from_buffer(data, 32, 32)
+        path = n.hints['image-path']
+        assert 'icon_data' not in n.hints
+        self.assertEqual(os.path.dirname(path), tmpdir)
+        with open(path, 'rb') as f:
+            self.assertEqual(f.read(8), b'\x89PNG\r\n\x1a\n')
+        n.show()
+        n.close()
+        
+        n.set_icon_from_buffer(data, 32, 32)
+        self.assertEqual(n.hints['image-path'], path)
+        self.assertEqual(os.listdir(tmpdir), [os.path.basename(path)])
+        
+        # RGBx pixels are saved as RGB, in a separate file
+        n.set_icon_from_buffer(data, 32, 32, has_alpha=False, channels=4)
+        rgb_path = n.hints['image-path']
+        self.assertNotEqual(rgb_path, path)
+        with open(rgb_path, 'rb') as f:
+            png = f.read()
+        self.assertEqual(png[25], 2)   # Colour type in IHDR: RGB
+        idat = png.index(b'IDAT')
+        length = int.from_bytes(png[idat - 4:idat], 'big')
+        raw = zlib.decompress(png[idat + 4:idat + 4 + length])
+        self.assertEqual(raw[:7], b'\x00\x00\x80\xff\x00\x80\xff')
+        
+        # Without the file cache, the new icon replaces the old file
+        notify2.icon_file_cache = None
+        n.set_icon_from_buffer(data, 32, 32)
+        assert 'image-path' not in n.hints
+        assert 'icon_data' in n.hints
+
+class AsyncioTests(unittest.TestCase):
+    """Test the asyncio interface.
+    """
+    def run_async(self, coro):
+        return self.loop.run_until_complete(coro)
+    
+    def setUp(self):
+        # Other tests may have closed the default loop, with asyncio.run()
+        self.loop = asyncio.new_event_loop()
+        self.run_async(notify2.aio.init("notify2 test suite"))
+    
+    def tearDown(self):
+        self.run_async(notify2.aio.uninit())
+        self.loop.close()
+    
+    def test_server_info_caps(self):
+        r = self.run_async(notify2.aio.get_server_info())
+        assert isinstance(r, dict), type(r)
+        r = self.run_async(notify2.aio.get_server_caps())
+        assert isinstance(r, list), type(r)
+    
+    def test_show_close(self):
+        n = notify2.Notification("Asyncio", "Sent from a coroutine")
+        n.set_urgency(notify2.URGENCY_LOW)
+        nid = self.run_async(notify2.aio.show(n))
+        self.assertEqual(n.id, nid)
+        self.run_async(notify2.aio.close(n))
+    
+    def test_subscribe_when_needed(self):
+        plain = notify2.Notification("Asyncio", "No callbacks")
+        self.run_async(notify2.aio.show(plain))
+        self.assertIsNone(notify2.aio._client._subscription)
+        
+        closed = []
+        n = notify2.Notification("Asyncio", "Closed callback")
+        n.connect('closed', closed.append)
+        self.run_async(notify2.aio.show(n))
+        # Found when subscribing
+        self.assertTrue(notify2.aio._client._server_owner.startswith(':'))
+        
+        async def close():
+            await notify2.aio.close(n)
+            while not closed:
+                await asyncio.sleep(0.01)
+        
+        self.run_async(close())
+        self.assertEqual(closed, [n])
+        self.assertIsNone(notify2.aio._client._subscription)
+    
+    def test_callback_error(self):
+        from types import SimpleNamespace
+        from jeepney import HeaderFields
+        clicked = []
+        
+        def fail(n, action):
+            raise ValueError("Error in a callback")
+        
+        notifications = [notify2.Notification("Asyncio") for i in range(2)]
+        notifications[0].add_action("ok", "OK", fail)
+        notifications[1].add_action("ok", "OK",
+                                    lambda n, action: clicked.append(action))
+        client = notify2.aio._client
+        for nid, n in enumerate(notifications, start=10001):
+            client.registry[nid] = n
+        
+        client._server_owner = ':1.42'
+        
+        async def dispatch():
+            queue = asyncio.Queue()
+            task = asyncio.ensure_future(client._dispatch_signals(queue))
+            # Not from the server, so ignored
+            for sender, nid in [(':1.43', 10002), (':1.42', 10001),
+                                (':1.42', 10002)]:
+                queue.put_nowait(SimpleNamespace(
+                    header=SimpleNamespace(
+                        fields={HeaderFields.member: 'ActionInvoked',
+                                HeaderFields.sender: sender}),
+                    body=(nid, "ok")))
+            while not clicked:
+                await asyncio.sleep(0.01)
+            self.assertFalse(task.done())
+            task.cancel()
+        
+        self.run_async(dispatch())
+        self.assertEqual(clicked, ["ok"])
+        client.registry.clear()
+    
+    def test_separate_clients(self):
+        from types import SimpleNamespace
+        from jeepney import HeaderFields
+        clicked = []
+        
+        # Tracked by the default synchronous client, which dispatches its own
+        # signals; the asyncio one mustn't run its callbacks as well.
+        sync_n = notify2.Notification("Synchronous")
+        sync_n.add_action("ok", "OK", lambda n, action: clicked.append(n))
+        notify2.notifications_registry[10001] = sync_n
+        
+        client = notify2.aio.AsyncNotificationClient()
+        n = notify2.Notification("Asyncio", client=client)
+        n.add_action("ok", "OK", lambda n, action: clicked.append(n))
+        
+        async def show():
+            await client.init("notify2 test suite 2")
+            try:
+                await notify2.aio.show(n)
+                self.assertIn(n.id, client.registry)
+                self.assertNotIn(n.id, notify2.aio._client.registry)
+                self.assertNotIn(n.id, notify2.notifications_registry)
+                
+                queue = asyncio.Queue()
+                task = asyncio.ensure_future(client._dispatch_signals(queue))
+                for nid in [10001, n.id]:
+                    queue.put_nowait(SimpleNamespace(
+                        header=SimpleNamespace(
+                            fields={HeaderFields.member: 'ActionInvoked',
+                                    HeaderFields.sender:
+                                        client._server_owner}),
+                        body=(nid, "ok")))
+                while not clicked:
+                    await asyncio.sleep(0.01)
+                task.cancel()
+                await notify2.aio.close(n)
+            finally:
+                await client.uninit()
+        
+        try:
+            self.run_async(show())
+        finally:
+            notify2.notifications_registry.clear()
+        self.assertEqual(clicked, [n])
+    
+    def test_init_again(self):
+        old_router = notify2.aio._client._router
+        old_task = notify2.aio._client._signal_task
+        self.run_async(notify2.aio.init("notify2 test suite"))
+        self.assertIsNot(notify2.aio._client._router, old_router)
+        self.assertTrue(old_task.cancelled())
+        self.assertTrue(notify2.aio.initted)
+        
+        r = self.run_async(notify2.aio.get_server_info())
+        assert isinstance(r, dict), type(r)
+
 if __name__ == "__main__":
     unittest.main()